@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import importlib
+import os
+import tempfile
+import time
+
+import node_store
+import registry_stand_in
+
+
+show_edges = importlib.import_module('show-edges')
+
+
+def benchmark(fixture, jobs=(1, 8), latency=0.01, page_size=50):
+    server = registry_stand_in.RegistryStandIn(fixture=fixture, page_size=page_size, latency=latency)
+    server.start()
+    repository = '{}/openshift-release-dev/ocp-release'.format(server.host)
+    print('{} tags, {} manifests, {} blobs, {:.3f}s injected latency per request'.format(len(fixture.tags), len(fixture.manifests), len(fixture.blobs), latency))
+    try:
+        for job_count in jobs:
+            with tempfile.TemporaryDirectory() as directory:
+                store = os.path.join(directory, 'nodes.sqlite')
+                for label in ['cold', 'warm']:
+                    server.requests.clear()
+                    start = time.perf_counter()
+                    show_edges.warm_nodes(repository=repository, store=store, directory=os.path.join(directory, 'nodes'), jobs=job_count)
+                    elapsed = time.perf_counter() - start
+                    with node_store.NodeStore(path=store) as release_store:
+                        stored = len(release_store)
+                    print('{:>3} jobs  {}  {:.3f}s  {:>5} requests  {} digests stored'.format(job_count, label, elapsed, sum(server.requests.values()), stored))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Measure end-to-end node store build time for show-edges.py against a local registry stand-in.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--fixture',
+        metavar='DIRECTORY',
+        help='Recorded fixture directory (see registry_stand_in.py).  Defaults to a synthesized fixture.',
+    )
+    parser.add_argument(
+        '--latency',
+        metavar='SECONDS',
+        type=float,
+        help='Delay injected before each registry response.',
+        default=0.01,
+    )
+    parser.add_argument(
+        '--page-size',
+        dest='page_size',
+        metavar='COUNT',
+        type=int,
+        help='Tags per page.',
+        default=50,
+    )
+    parser.add_argument(
+        '--jobs',
+        metavar='COUNT',
+        type=int,
+        nargs='+',
+        help='Concurrent retrieval counts to compare.',
+        default=[1, 8],
+    )
+
+    args = parser.parse_args()
+
+    if args.fixture:
+        fixture = registry_stand_in.Fixture.load(directory=args.fixture)
+    else:
+        fixture = registry_stand_in.synthesize()
+    benchmark(fixture=fixture, jobs=args.jobs, latency=args.latency, page_size=args.page_size)
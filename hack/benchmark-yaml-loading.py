@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+import os
+import time
+
+import yaml
+
+import util
+
+
+def benchmark(directories, revision=None, repeat=3, processes=0):
+    modes = [
+        ('serial, pure-Python loader', {'loader': yaml.SafeLoader}),
+        ('serial, {}'.format(util.FAST_SAFE_LOADER.__name__), {'loader': util.FAST_SAFE_LOADER}),
+        ('pooled ({} processes), {}'.format(processes or os.cpu_count(), util.FAST_SAFE_LOADER.__name__), {'loader': util.FAST_SAFE_LOADER, 'processes': processes}),
+    ]
+    if util.FAST_SAFE_LOADER is yaml.SafeLoader:
+        print('libyaml is not available; the C loader modes fall back to the pure-Python loader.')
+
+    baseline = None
+    for label, kwargs in modes:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            documents = []
+            for directory in directories:
+                documents.extend(util.walk_yaml(directory=directory, revision=revision, cache=None, **kwargs))
+            timings.append(time.perf_counter() - start)
+        if baseline is None:
+            baseline = documents
+        elif documents != baseline:
+            raise ValueError('{} returned different documents than the pure-Python loader'.format(label))
+        best = min(timings)
+        print('{:<40} {:>4} files  best {:.3f}s  mean {:.3f}s'.format(label, len(documents), best, sum(timings) / len(timings)))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Compare YAML loading modes for graph-data directories.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--revision',
+        metavar='REVISION',
+        help='Git revision for loading graph-data (see gitrevisions(7) for syntax).  Defaults to the working tree.',
+    )
+    parser.add_argument(
+        '--repeat',
+        metavar='COUNT',
+        type=int,
+        help='Number of timed runs for each mode.',
+        default=3,
+    )
+    parser.add_argument(
+        '--processes',
+        metavar='COUNT',
+        type=int,
+        help='Worker processes for the pooled mode (0 for one per CPU).',
+        default=0,
+    )
+    parser.add_argument(
+        'directories',
+        metavar='DIRECTORY',
+        nargs='*',
+        help='Directories to load.',
+        default=['blocked-edges', 'channels', 'internal-channels'],
+    )
+
+    args = parser.parse_args()
+
+    benchmark(directories=args.directories, revision=args.revision, repeat=args.repeat, processes=args.processes)
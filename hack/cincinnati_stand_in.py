@@ -0,0 +1,206 @@
+# Local Cincinnati-compatible graph server for offline runs of the hack tools.
+#
+# It serves /graph?channel=&arch= from graph-data at a chosen revision,
+# assembled by graph_builder.py, so show-edges.py --cincinnati and
+# stabilization-changes.py --update-service can run against it.
+
+import asyncio
+import collections
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import urllib.parse
+
+import graph_builder
+
+
+_LOGGER = logging.getLogger(__name__)
+_REASONS = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+Response = collections.namedtuple('Response', ['etag', 'body', 'gzipped'])
+
+
+class GraphServer(object):
+    """Serve Cincinnati graph JSON for the channels known to a graph_builder.GraphBuilder.
+
+    Each channel and architecture response is computed once, and kept in
+    memory with its gzipped body and an ETag, so If-None-Match requests
+    get 304 responses.  Connections are kept alive, and latency seconds
+    are injected before each response.  stats counts responses by status.
+    """
+    def __init__(self, builder, latency=0):
+        self.builder = builder
+        self.latency = latency
+        self.stats = collections.Counter()
+        self._responses = {}
+        self._lock = None
+
+    def response(self, channel, architecture):
+        """Return the Response for the channel and architecture, computing it if necessary."""
+        key = (channel, architecture)
+        if key not in self._responses:
+            if channel in self.builder.channels:
+                graph = self.builder.graph(channel=channel, architecture=architecture)
+            else:
+                graph = {'nodes': [], 'edges': [], 'conditionalEdges': []}
+            body = json.dumps(graph, sort_keys=True).encode('utf-8')
+            self._responses[key] = Response(etag='"{}"'.format(hashlib.sha256(body).hexdigest()[:32]), body=body, gzipped=gzip.compress(body))
+        return self._responses[key]
+
+    def precompute(self, channels=None, architectures=graph_builder.ARCHITECTURES):
+        for architecture in architectures:
+            for channel in sorted(channels or self.builder.channels):
+                self.response(channel=channel, architecture=architecture)
+
+    async def start(self, host='127.0.0.1', port=8080):
+        self._lock = asyncio.Lock()
+        return await asyncio.start_server(self._handle, host=host, port=port)
+
+    def start_in_thread(self, host='127.0.0.1', port=0):
+        """Serve from an event loop in a daemon thread, returning (URI of the graph endpoint, stop function)."""
+        loop = asyncio.new_event_loop()
+        started = threading.Event()
+        state = {}
+
+        def run():
+            asyncio.set_event_loop(loop)
+            state['server'] = loop.run_until_complete(self.start(host=host, port=port))
+            started.set()
+            loop.run_forever()
+
+        def stop():
+            loop.call_soon_threadsafe(state['server'].close)
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        started.wait()
+        address = state['server'].sockets[0].getsockname()
+        return 'http://{}:{}/graph'.format(address[0], address[1]), stop
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                status, response_headers, body = await self._respond(method=method, target=target, headers=headers)
+                self.stats[status] += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                response_headers['Content-Length'] = str(len(body))
+                response_headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+                lines = ['HTTP/1.1 {} {}'.format(status, _REASONS[status])]
+                lines.extend('{}: {}'.format(name, value) for name, value in response_headers.items())
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body if method != 'HEAD' else b''))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError) as error:
+            _LOGGER.debug('closing connection: {}'.format(error))
+        finally:
+            writer.close()
+
+    async def _respond(self, method, target, headers):
+        if method not in ('GET', 'HEAD'):
+            return 405, {'Allow': 'GET, HEAD'}, b''
+        split_target = urllib.parse.urlsplit(target)
+        if not split_target.path.rstrip('/').endswith('/graph'):
+            return 404, {}, b''
+        query = urllib.parse.parse_qs(split_target.query)
+        channel = query.get('channel', [''])[0]
+        architecture = query.get('arch', ['amd64'])[0]
+        if not channel:
+            return 400, {'Content-Type': 'application/json'}, json.dumps({'kind': 'missing_params', 'value': 'mandatory client parameters missing: channel'}).encode('utf-8')
+        if architecture not in graph_builder.ARCHITECTURES:
+            return 400, {'Content-Type': 'application/json'}, json.dumps({'kind': 'invalid_params', 'value': 'unknown architecture {!r}'.format(architecture)}).encode('utf-8')
+
+        response = self._responses.get((channel, architecture))
+        if response is None:
+            async with self._lock:  # graph_builder caches are not thread-safe, so compute one response at a time
+                response = await asyncio.get_running_loop().run_in_executor(None, self.response, channel, architecture)
+
+        response_headers = {'Content-Type': 'application/json', 'ETag': response.etag, 'Vary': 'Accept-Encoding'}
+        if headers.get('if-none-match') == response.etag:
+            return 304, response_headers, b''
+        if 'gzip' in headers.get('accept-encoding', ''):
+            response_headers['Content-Encoding'] = 'gzip'
+            return 200, response_headers, response.gzipped
+        return 200, response_headers, response.body
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Serve Cincinnati graphs assembled from graph-data, e.g. for show-edges.py --cincinnati http://127.0.0.1:8080/graph CHANNEL.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--revision',
+        metavar='REVISION',
+        help='Git revision for loading graph-data (see gitrevisions(7) for syntax).  Defaults to the working tree.',
+    )
+    parser.add_argument(
+        '--store',
+        metavar='PATH',
+        help='Release metadata store (see show-edges.py --warm-all-channels).',
+        default='.nodes.sqlite',
+    )
+    parser.add_argument(
+        '--repository',
+        metavar='REPOSITORY',
+        help='Image registry repository for node payload pullspecs.',
+        default='quay.io/openshift-release-dev/ocp-release',
+    )
+    parser.add_argument(
+        '--address',
+        metavar='HOST',
+        help='Address to listen on.',
+        default='127.0.0.1',
+    )
+    parser.add_argument(
+        '--port',
+        metavar='PORT',
+        type=int,
+        help='Port to listen on.',
+        default=8080,
+    )
+    parser.add_argument(
+        '--latency',
+        metavar='SECONDS',
+        type=float,
+        help='Delay injected before each response.',
+        default=0,
+    )
+    parser.add_argument(
+        '--precompute',
+        action='store_true',
+        help='Compute every channel and architecture response before serving, instead of on first request.',
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    server = GraphServer(builder=graph_builder.GraphBuilder(revision=args.revision, store=args.store, repository=args.repository), latency=args.latency)
+    if args.precompute:
+        server.precompute()
+
+    async def main():
+        listener = await server.start(host=args.address, port=args.port)
+        _LOGGER.info('serving {} channels on http://{}:{}/graph'.format(len(server.builder.channels), args.address, args.port))
+        async with listener:
+            await listener.serve_forever()
+
+    asyncio.run(main())
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import graph_builder
+import util
+
+
+_LOGGER = logging.getLogger(__name__)
+_CHANNEL_DIRECTORIES = ('channels', 'internal-channels')
+_RAW_METADATA = 'raw/metadata.json'
+
+
+def changed_paths(old, new=None, directories=_CHANNEL_DIRECTORIES + ('blocked-edges', 'raw')):
+    """Return the set of paths under directories which differ between old and new (default the working tree, including untracked files)."""
+    command = ['git', 'diff', '--name-only', '--no-renames', '-z', old]
+    if new:
+        command.append(new)
+    output = subprocess.run(command + ['--'] + list(directories), capture_output=True, check=True).stdout
+    if not new:
+        output += b'\0' + subprocess.run(['git', 'ls-files', '--others', '--exclude-standard', '-z', '--'] + list(directories), capture_output=True, check=True).stdout
+    return set(path for path in output.decode('utf-8').split('\0') if path)
+
+
+def _targets_match(name, targets):
+    version, architecture = graph_builder.split_release_name(name)
+    for target_architecture in targets.get(version, ()):
+        if target_architecture is None or architecture is None or target_architecture == architecture:
+            return True
+    return False
+
+
+def affected_channels(changed, targets, revisions):
+    """Return the names of channels whose graphs may differ.
+
+    changed is the set of changed paths, targets is {version: {architecture or None, ...}}
+    for releases whose edges may differ, and revisions is a list of
+    (channels, paths) from util.load_channels.  A channel is affected if
+    its file changed, or if it includes any target.
+    """
+    affected = set()
+    for channels, paths in revisions:
+        for name, data in channels.items():
+            if paths.get(name) in changed or any(_targets_match(name=entry, targets=targets) for entry in data.get('versions', [])):
+                affected.add(name)
+    return affected
+
+
+def _edge_sets(graph):
+    versions = [node['version'] for node in graph['nodes']]
+    edges = set((versions[from_index], versions[to_index]) for from_index, to_index in graph['edges'])
+    conditional_edges = {}
+    for conditional_edge in graph['conditionalEdges']:
+        for edge in conditional_edge['edges']:
+            conditional_edges[(edge['from'], edge['to'])] = set(risk['name'] for risk in conditional_edge['risks'])
+    return set(versions), edges, conditional_edges
+
+
+def _sorted_edges(edges):
+    return sorted(edges, key=lambda edge: (graph_builder.version_key(edge[0]), graph_builder.version_key(edge[1])))
+
+
+def diff_graphs(old, new):
+    """Return the node, edge, and conditional-edge differences between two Cincinnati graph JSON documents, or None if there are none."""
+    old_versions, old_edges, old_conditional = _edge_sets(old)
+    new_versions, new_edges, new_conditional = _edge_sets(new)
+    diff = {}
+    if new_versions != old_versions:
+        diff['nodes'] = {
+            'added': sorted(new_versions - old_versions, key=graph_builder.version_key),
+            'removed': sorted(old_versions - new_versions, key=graph_builder.version_key),
+        }
+    if new_edges != old_edges:
+        diff['edges'] = {
+            'added': [list(edge) for edge in _sorted_edges(new_edges - old_edges)],
+            'removed': [list(edge) for edge in _sorted_edges(old_edges - new_edges)],
+        }
+    conditional = {'added': [], 'removed': [], 'changed': []}
+    for edge in _sorted_edges(set(old_conditional) | set(new_conditional)):
+        old_risks = old_conditional.get(edge)
+        new_risks = new_conditional.get(edge)
+        entry = {'from': edge[0], 'to': edge[1]}
+        if old_risks is None:
+            entry['risks'] = sorted(new_risks)
+            conditional['added'].append(entry)
+        elif new_risks is None:
+            entry['risks'] = sorted(old_risks)
+            conditional['removed'].append(entry)
+        elif old_risks != new_risks:
+            entry['addedRisks'] = sorted(new_risks - old_risks)
+            entry['removedRisks'] = sorted(old_risks - new_risks)
+            conditional['changed'].append(entry)
+    if any(conditional.values()):
+        diff['conditionalEdges'] = conditional
+    return diff or None
+
+
+def graph_diff(old, new=None, channels=None, architectures=graph_builder.ARCHITECTURES, store='.nodes.sqlite', repository='quay.io/openshift-release-dev/ocp-release', cache=util.DEFAULT_YAML_CACHE):
+    """Yield per-channel and per-architecture graph differences from revision old to revision new (default the working tree).
+
+    Only channels touched by changes to channel files, or including the
+    to releases of changed blocked edges or releases with changed
+    raw/metadata.json overlays, are assembled and compared.  Parsed
+    YAML is shared between the revisions through the blob-keyed cache,
+    so unchanged files are only parsed once.
+    """
+    changed = changed_paths(old=old, new=new)
+    if not changed:
+        return
+    _LOGGER.info('{} changed paths'.format(len(changed)))
+
+    old_channels, old_paths = util.load_channels(revision=old, cache=cache)
+    new_channels, new_paths = util.load_channels(revision=new, cache=cache)
+
+    targets = {}
+    blocked_paths = sorted(path for path in changed if path.startswith('blocked-edges/'))
+    for revision in [old, new]:
+        for _, data in util.load_yaml_files(paths=blocked_paths, revision=revision, cache=cache):
+            version, architecture = graph_builder.split_release_name(data['to'])
+            targets.setdefault(version, set()).add(architecture)
+    old_raw = graph_builder.load_raw_metadata(revision=old)
+    if _RAW_METADATA in changed:
+        new_raw = graph_builder.load_raw_metadata(revision=new)
+        for name in set(old_raw) | set(new_raw):
+            if old_raw.get(name) != new_raw.get(name):
+                version, architecture = graph_builder.split_release_name(name)
+                targets.setdefault(version, set()).add(architecture)
+    else:
+        new_raw = old_raw
+
+    affected = affected_channels(changed=changed, targets=targets, revisions=[(old_channels, old_paths), (new_channels, new_paths)])
+    if channels is not None:
+        affected &= set(channels)
+    _LOGGER.info('comparing {} of {} channels'.format(len(affected), len(set(old_channels) | set(new_channels))))
+    if not affected:
+        return
+
+    # channel graphs only depend on the releases they include, so the builders only need the affected channels
+    builders = []
+    for revision, revision_channels, raw_metadata in [(old, old_channels, old_raw), (new, new_channels, new_raw)]:
+        builders.append(graph_builder.GraphBuilder(
+            revision=revision,
+            store=store,
+            repository=repository,
+            cache=cache,
+            channels={name: data for name, data in revision_channels.items() if name in affected},
+            raw_metadata=raw_metadata,
+        ))
+    old_builder, new_builder = builders
+    empty = {'nodes': [], 'edges': [], 'conditionalEdges': []}
+    for architecture in architectures:
+        for channel in sorted(affected):
+            old_graph = old_builder.graph(channel=channel, architecture=architecture) if channel in old_builder.channels else empty
+            new_graph = new_builder.graph(channel=channel, architecture=architecture) if channel in new_builder.channels else empty
+            diff = diff_graphs(old=old_graph, new=new_graph)
+            if diff:
+                yield dict({'channel': channel, 'architecture': architecture}, **diff)
+
+
+class TestGraphDiff(unittest.TestCase):
+    def test_changed_paths(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(directory)
+            os.mkdir('channels')
+            for path in ['channels/stable-4.16.yaml', 'channels/fast-4.16.yaml']:
+                with open(path, 'w') as f:
+                    f.write('name: {}\n'.format(path))
+            subprocess.run(['git', 'init', '--quiet'], check=True)
+            subprocess.run(['git', 'add', 'channels'], check=True)
+            subprocess.run(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '--quiet', '--message', 'Initial'], check=True)
+            with open('channels/fast-4.16.yaml', 'a') as f:
+                f.write('versions: []\n')
+            with open('channels/candidate-4.16.yaml', 'w') as f:
+                f.write('name: candidate-4.16\n')
+            self.assertEqual(changed_paths(old='HEAD'), {'channels/fast-4.16.yaml', 'channels/candidate-4.16.yaml'})
+            self.assertEqual(changed_paths(old='HEAD', new='HEAD'), set())
+
+    def test_affected_channels(self):
+        channels = {
+            'candidate-4.16': {'versions': ['4.16.0', '4.16.1', '4.16.2']},
+            'fast-4.16': {'versions': ['4.16.0', '4.16.1+amd64']},
+            'stable-4.16': {'versions': ['4.16.0']},
+        }
+        paths = {name: 'channels/{}.yaml'.format(name) for name in channels}
+        revisions = [(channels, paths)]
+        self.assertEqual(affected_channels(changed={'channels/stable-4.16.yaml'}, targets={}, revisions=revisions), {'stable-4.16'})
+        self.assertEqual(affected_channels(changed=set(), targets={'4.16.1': {'arm64'}}, revisions=revisions), {'candidate-4.16'})
+        self.assertEqual(affected_channels(changed=set(), targets={'4.16.1': {None}}, revisions=revisions), {'candidate-4.16', 'fast-4.16'})
+
+    def test_diff_graphs(self):
+        def node(version):
+            return {'version': version, 'payload': '', 'metadata': {}}
+
+        old = {
+            'nodes': [node('4.16.0'), node('4.16.1'), node('4.16.2')],
+            'edges': [[0, 1], [0, 2]],
+            'conditionalEdges': [{'edges': [{'from': '4.16.1', 'to': '4.16.2'}], 'risks': [{'name': 'A'}]}],
+        }
+        new = {
+            'nodes': [node('4.16.0'), node('4.16.1'), node('4.16.2'), node('4.16.3')],
+            'edges': [[0, 1], [2, 3]],
+            'conditionalEdges': [
+                {'edges': [{'from': '4.16.0', 'to': '4.16.2'}], 'risks': [{'name': 'B'}]},
+                {'edges': [{'from': '4.16.1', 'to': '4.16.2'}], 'risks': [{'name': 'B'}]},
+            ],
+        }
+        self.assertEqual(diff_graphs(old=old, new=new), {
+            'nodes': {'added': ['4.16.3'], 'removed': []},
+            'edges': {'added': [['4.16.2', '4.16.3']], 'removed': [['4.16.0', '4.16.2']]},
+            'conditionalEdges': {
+                'added': [{'from': '4.16.0', 'to': '4.16.2', 'risks': ['B']}],
+                'removed': [],
+                'changed': [{'from': '4.16.1', 'to': '4.16.2', 'addedRisks': ['B'], 'removedRisks': ['A']}],
+            },
+        })
+        self.assertIsNone(diff_graphs(old=new, new=new))
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Show the edges, conditional edges, and risk names which differ between the graphs of two graph-data revisions, as JSON.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--store',
+        metavar='PATH',
+        help='Release metadata store (see show-edges.py --warm-all-channels).',
+        default='.nodes.sqlite',
+    )
+    parser.add_argument(
+        '--architecture',
+        metavar='ARCHITECTURE',
+        action='append',
+        help='Architecture to compare (may be given multiple times).  Defaults to all architectures.',
+    )
+    parser.add_argument(
+        '--channel',
+        metavar='CHANNEL',
+        action='append',
+        help='Only compare this channel (may be given multiple times).  Defaults to all affected channels.',
+    )
+    parser.add_argument(
+        'old',
+        metavar='OLD',
+        help='Git revision to compare from (see gitrevisions(7) for syntax).',
+    )
+    parser.add_argument(
+        'new',
+        metavar='NEW',
+        nargs='?',
+        help='Git revision to compare to.  Defaults to the working tree.',
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    diffs = list(graph_diff(old=args.old, new=args.new, channels=args.channel, architectures=args.architecture or graph_builder.ARCHITECTURES, store=args.store))
+    json.dump(diffs, sys.stdout, indent=2)
+    sys.stdout.write('\n')
@@ -0,0 +1,341 @@
+# Offline assembly of Cincinnati update graphs from graph-data and the node store.
+
+import collections
+import json
+import logging
+import os
+import re
+import tempfile
+import unittest
+
+import node_store
+import util
+
+
+_LOGGER = logging.getLogger(__name__)
+_VERSION_REGEXP = re.compile(r'^(?P<major>0|[1-9]\d*)\.(?P<minor>0|[1-9]\d*)\.(?P<patch>0|[1-9]\d*)(?:-(?P<prerelease>[0-9a-zA-Z.-]+))?(?:\+(?P<buildmetadata>[0-9a-zA-Z.-]+))?$')
+ARCHITECTURES = ('amd64', 'arm64', 'multi', 'ppc64le', 's390x')
+CHANNELS_ANNOTATION = 'io.openshift.upgrades.graph.release.channels'
+MANIFESTREF_ANNOTATION = 'io.openshift.upgrades.graph.release.manifestref'
+ARCHITECTURE_ANNOTATION = 'release.openshift.io/architecture'
+_EDGE_ANNOTATION_PREFIX = 'io.openshift.upgrades.graph.'
+_RISK_PROPERTIES = ('url', 'name', 'message', 'matchingRules')
+
+
+def version_key(version):
+    """Sort key ordering versions by SemVer precedence."""
+    match = _VERSION_REGEXP.match(version)
+    if not match:
+        return ((), version)
+    prerelease = match.group('prerelease')
+    if prerelease is None:
+        prerelease_key = (1, ())
+    else:
+        prerelease_key = (0, tuple((0, int(part), '') if part.isdigit() else (1, 0, part) for part in prerelease.split('.')))
+    return ((int(match.group('major')), int(match.group('minor')), int(match.group('patch')), prerelease_key), version)
+
+
+def split_release_name(name):
+    """Return (version, architecture) for a release name, with architecture None unless it has build metadata."""
+    version, _, architecture = name.partition('+')
+    return version, architecture or None
+
+
+def load_raw_metadata(revision=None, path='raw/metadata.json'):
+    """Return the {release name: {annotation: value}} overlays from raw/metadata.json."""
+    if revision:
+        blobs = [object_name for _, object_name in util.ls_tree(directory=path, revision=revision)]
+        if not blobs:
+            return {}
+        with util.GitObjectReader() as reader:
+            return json.loads(reader.read(blobs[0]).decode('utf-8'))
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+class GraphBuilder(object):
+    """Approximate the graphs Cincinnati serves, from graph-data at a revision and stored release metadata.
+
+    For each architecture, the stored releases for every channel version
+    get edges from their release-metadata previous and next lists.
+    Edge annotations from the release metadata and raw/metadata.json
+    overlays are then applied: release.remove tombstones drop releases,
+    previous.add and next.add add edges, and previous.remove,
+    previous.remove_regex, and next.remove drop edges.  Blocked edges
+    without matchingRules drop matching edges, and blocked edges with
+    matchingRules turn them into conditional edges.  Channel graphs are
+    then filtered from the architecture graph.  Shared inputs are loaded
+    once, and architecture graphs are computed once, in memory.  This
+    follows the graph-data semantics documented in the repository README,
+    not Cincinnati's implementation, so the results may differ from a live
+    Cincinnati, e.g. in node order or for releases missing from the store.
+    """
+    def __init__(self, revision=None, store='.nodes.sqlite', repository='quay.io/openshift-release-dev/ocp-release', cache=util.DEFAULT_YAML_CACHE, channels=None, blocked_edges=None, raw_metadata=None, releases=None):
+        self.revision = revision
+        self.store = store
+        self.repository = repository
+        if channels is None:
+            channels, _ = util.load_channels(revision=revision, cache=cache)
+        self.channels = channels
+        if blocked_edges is None:
+            blocked_edges = [data for _, data in util.walk_yaml(directory='blocked-edges', revision=revision, cache=cache)]
+        self.blocked_edges = blocked_edges
+        if raw_metadata is None:
+            raw_metadata = load_raw_metadata(revision=revision)
+        self.raw_metadata = raw_metadata
+        self._releases = releases or {}
+        self._architecture_graphs = {}
+
+    def channel_versions(self, channel, architecture):
+        """Return the set of versions the channel contains for the architecture."""
+        versions = set()
+        for name in self.channels[channel].get('versions', []):
+            version, name_architecture = split_release_name(name)
+            if name_architecture is None or name_architecture == architecture:
+                versions.add(version)
+        return versions
+
+    def releases(self, architecture):
+        """Return {version: (digest, meta)} for the stored releases in any channel.
+
+        Raises ValueError if the store does not exist, rather than creating
+        an empty one and assembling empty graphs.
+        """
+        if architecture not in self._releases:
+            versions = set()
+            for channel in self.channels:
+                versions.update(self.channel_versions(channel=channel, architecture=architecture))
+            if not os.path.exists(self.store):
+                raise ValueError('no release metadata store at {} (see show-edges.py --warm-all-channels)'.format(self.store))
+            with node_store.NodeStore(path=self.store) as release_store:
+                self._releases[architecture] = release_store.lookup(versions=versions, architecture=architecture)
+            if versions and not self._releases[architecture]:
+                _LOGGER.warning('none of the {} {} channel versions are in {}, so its graphs will be empty'.format(len(versions), architecture, self.store))
+        return self._releases[architecture]
+
+    def architecture_graph(self, architecture):
+        """Return (nodes, edges, risks) for the architecture.
+
+        nodes is {version: node}, edges is a set of (from, to) versions,
+        and risks is {(from, to): [risk, ...]} for conditional edges.
+        """
+        if architecture in self._architecture_graphs:
+            return self._architecture_graphs[architecture]
+
+        releases = self.releases(architecture=architecture)
+        annotations = {}
+        for version, (_, meta) in releases.items():
+            version_annotations = dict(meta.get('metadata') or {})
+            for name in [version, '{}+{}'.format(version, architecture)]:
+                version_annotations.update(self.raw_metadata.get(name, {}))
+            annotations[version] = version_annotations
+        versions = set(version for version in releases if annotations[version].get(_EDGE_ANNOTATION_PREFIX + 'release.remove') != 'true')
+
+        edges = set()
+        for version in versions:
+            _, meta = releases[version]
+            edges.update((previous, version) for previous in meta.get('previous', []) if previous in versions)
+            edges.update((version, next_version) for next_version in meta.get('next', []) if next_version in versions)
+
+        for version in versions:
+            version_annotations = annotations[version]
+            for previous in _split_annotation(version_annotations.get(_EDGE_ANNOTATION_PREFIX + 'previous.add')):
+                if previous in versions:
+                    edges.add((previous, version))
+            for next_version in _split_annotation(version_annotations.get(_EDGE_ANNOTATION_PREFIX + 'next.add')):
+                if next_version in versions:
+                    edges.add((version, next_version))
+
+        removed = set()
+        incoming = collections.defaultdict(list)
+        for from_version, to_version in edges:
+            incoming[to_version].append(from_version)
+        for version in versions:
+            version_annotations = annotations[version]
+            for previous in _split_annotation(version_annotations.get(_EDGE_ANNOTATION_PREFIX + 'previous.remove')):
+                removed.add((previous, version))
+            for next_version in _split_annotation(version_annotations.get(_EDGE_ANNOTATION_PREFIX + 'next.remove')):
+                removed.add((version, next_version))
+            remove_regex = version_annotations.get(_EDGE_ANNOTATION_PREFIX + 'previous.remove_regex')
+            if remove_regex:
+                regexp = re.compile(remove_regex)
+                removed.update((previous, version) for previous in incoming[version] if regexp.search(previous))
+        edges -= removed
+
+        edges, risks = self._block(edges=edges, architecture=architecture)
+
+        channels = collections.defaultdict(list)
+        for channel in sorted(self.channels):
+            for version in self.channel_versions(channel=channel, architecture=architecture):
+                channels[version].append(channel)
+        nodes = {}
+        for version in versions:
+            digest, meta = releases[version]
+            metadata = {key: value for key, value in annotations[version].items() if not key.startswith(_EDGE_ANNOTATION_PREFIX)}
+            metadata[CHANNELS_ANNOTATION] = ','.join(channels[version])
+            metadata[MANIFESTREF_ANNOTATION] = digest
+            if architecture == 'multi':
+                metadata[ARCHITECTURE_ANNOTATION] = 'multi'
+            nodes[version] = {
+                'version': version,
+                'payload': '{}@{}'.format(self.repository, digest),
+                'metadata': metadata,
+            }
+
+        self._architecture_graphs[architecture] = (nodes, edges, risks)
+        return self._architecture_graphs[architecture]
+
+    def _block(self, edges, architecture):
+        blocks = collections.defaultdict(list)
+        for block in self.blocked_edges:
+            to, block_architecture = split_release_name(block['to'])
+            if block_architecture is None or block_architecture == architecture:
+                blocks[to].append(block)
+        regexps = {}
+        risks = collections.defaultdict(list)
+        unblocked = set()
+        for from_version, to_version in edges:
+            from_name = '{}+{}'.format(from_version, architecture)
+            dropped = False
+            for block in blocks.get(to_version, []):
+                regexp = regexps.get(block['from'])
+                if regexp is None:
+                    regexp = regexps[block['from']] = re.compile(block['from'])
+                if not regexp.search(from_name):  # substring match, per the 'from' documentation in the repository README
+                    continue
+                if block.get('matchingRules'):
+                    risks[(from_version, to_version)].append({key: block[key] for key in _RISK_PROPERTIES if key in block})
+                else:
+                    dropped = True
+                    break
+            if dropped:
+                risks.pop((from_version, to_version), None)
+            elif (from_version, to_version) not in risks:
+                unblocked.add((from_version, to_version))
+        for key, edge_risks in risks.items():
+            deduplicated = {risk['name']: risk for risk in edge_risks}
+            risks[key] = [deduplicated[name] for name in sorted(deduplicated)]
+        return unblocked, dict(risks)
+
+    def graph(self, channel, architecture):
+        """Return the Cincinnati graph JSON (nodes, edges, and conditionalEdges) for the channel and architecture."""
+        nodes, edges, risks = self.architecture_graph(architecture=architecture)
+        versions = sorted((version for version in self.channel_versions(channel=channel, architecture=architecture) if version in nodes), key=version_key)
+        indexes = {version: i for i, version in enumerate(versions)}
+        graph = {
+            'nodes': [nodes[version] for version in versions],
+            'edges': sorted([indexes[from_version], indexes[to_version]] for from_version, to_version in edges if from_version in indexes and to_version in indexes),
+            'conditionalEdges': [],
+        }
+        grouped = collections.defaultdict(list)
+        for (from_version, to_version), edge_risks in risks.items():
+            if from_version in indexes and to_version in indexes:
+                grouped[json.dumps(edge_risks, sort_keys=True)].append((from_version, to_version))
+        for key, group in sorted(grouped.items()):
+            graph['conditionalEdges'].append({
+                'edges': [{'from': from_version, 'to': to_version} for from_version, to_version in sorted(group, key=lambda edge: (version_key(edge[0]), version_key(edge[1])))],
+                'risks': json.loads(key),
+            })
+        return graph
+
+    def graphs(self, channels=None, architectures=ARCHITECTURES):
+        """Yield (channel, architecture, graph) for the channels (default all) and architectures."""
+        for architecture in architectures:
+            for channel in sorted(channels or self.channels):
+                yield channel, architecture, self.graph(channel=channel, architecture=architecture)
+
+
+def _split_annotation(value):
+    if not value:
+        return []
+    return [entry.strip() for entry in value.split(',') if entry.strip()]
+
+
+class TestGraphBuilder(unittest.TestCase):
+    def test_block(self):
+        risk = {'url': 'https://example.com/risk', 'name': 'Risk', 'message': 'Risky.', 'matchingRules': [{'type': 'Always'}]}
+        builder = GraphBuilder(
+            channels={'stable-4.16': {'name': 'stable-4.16', 'versions': ['4.15.16', '4.16.0', '4.16.1']}},
+            blocked_edges=[dict(risk, to='4.16.1', **{'from': '^4[.]16[.]0[+]amd64$'}), {'to': '4.16.1', 'from': '15[.]16'}],
+            raw_metadata={},
+            releases={'amd64': {
+                '4.15.16': ('sha256:0', {}),
+                '4.16.0': ('sha256:1', {'previous': ['4.15.16']}),
+                '4.16.1': ('sha256:2', {'previous': ['4.15.16', '4.16.0']}),
+            }},
+        )
+        graph = builder.graph(channel='stable-4.16', architecture='amd64')
+        self.assertEqual(graph['edges'], [[0, 1]])  # 15[.]16 matches 4.15.16 as a substring
+        self.assertEqual(graph['conditionalEdges'], [{'edges': [{'from': '4.16.0', 'to': '4.16.1'}], 'risks': [risk]}])
+
+    def test_missing_store(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = os.path.join(directory, 'nodes.sqlite')
+            builder = GraphBuilder(store=store, channels={'stable-4.16': {'name': 'stable-4.16', 'versions': ['4.16.0']}}, blocked_edges=[], raw_metadata={})
+            with self.assertRaisesRegex(ValueError, 'no release metadata store'):
+                builder.graph(channel='stable-4.16', architecture='amd64')
+            self.assertFalse(os.path.exists(store))
+            with node_store.NodeStore(path=store):
+                pass
+            with self.assertLogs(_LOGGER, level='WARNING'):
+                self.assertEqual(builder.graph(channel='stable-4.16', architecture='amd64')['nodes'], [])
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(
+        description='Assemble Cincinnati graph JSON from graph-data and stored release metadata (see show-edges.py --warm-all-channels), without a running Cincinnati.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--revision',
+        metavar='REVISION',
+        help='Git revision for loading graph-data (see gitrevisions(7) for syntax).  Defaults to the working tree.',
+    )
+    parser.add_argument(
+        '--store',
+        metavar='PATH',
+        help='Release metadata store.',
+        default='.nodes.sqlite',
+    )
+    parser.add_argument(
+        '--repository',
+        metavar='REPOSITORY',
+        help='Image registry repository for node payload pullspecs.',
+        default='quay.io/openshift-release-dev/ocp-release',
+    )
+    parser.add_argument(
+        '--architecture',
+        metavar='ARCHITECTURE',
+        action='append',
+        help='Architecture to assemble.  May be given multiple times.  Defaults to amd64.',
+    )
+    parser.add_argument(
+        '--output-directory',
+        dest='output_directory',
+        metavar='DIRECTORY',
+        help='Write DIRECTORY/ARCHITECTURE/CHANNEL.json for each channel, instead of printing a single channel graph.',
+    )
+    parser.add_argument(
+        'channels',
+        metavar='CHANNEL',
+        nargs='*',
+        help='Channels to assemble.  Defaults to all channels with --output-directory.',
+    )
+
+    args = parser.parse_args()
+    architectures = args.architecture or ['amd64']
+    builder = GraphBuilder(revision=args.revision, store=args.store, repository=args.repository)
+    if args.output_directory:
+        for channel, architecture, graph in builder.graphs(channels=args.channels or None, architectures=architectures):
+            path = os.path.join(args.output_directory, architecture, '{}.json'.format(channel))
+            util.atomic_write(path=path, content=json.dumps(graph, indent=2, sort_keys=True).encode('utf-8'))
+    elif len(args.channels) != 1 or len(architectures) != 1:
+        parser.error('exactly one channel and architecture are required without --output-directory')
+    else:
+        json.dump(builder.graph(channel=args.channels[0], architecture=architectures[0]), sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
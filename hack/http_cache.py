@@ -0,0 +1,222 @@
+# Shared on-disk HTTP cache for the hack tools.
+
+import codecs
+import collections
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+import urllib.error
+import urllib.request
+
+import util
+
+
+_LOGGER = logging.getLogger(__name__)
+_FORMAT = 1
+
+
+class HTTPCache(object):
+    """Cache GET responses on disk, one file per URI and request headers.
+
+    Responses younger than ttl seconds are served without a request.
+    Older responses are revalidated with If-None-Match and
+    If-Modified-Since when the server provided an ETag or Last-Modified,
+    and a 304 refreshes the stored response.  Requests ask for gzip
+    encoding, and bodies are stored as received, so the cache holds
+    compressed bodies when the server supports it.  When the total size
+    exceeds max_bytes, the least recently used entries are evicted.
+    stats counts hits, revalidations, misses, and evictions.
+    """
+    def __init__(self, directory='.http-cache', ttl=60, max_bytes=256 * 1024 * 1024, timeout=60):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.stats = collections.Counter()
+        self._lock = threading.Lock()
+
+    def get(self, uri, headers=None):
+        """Return the decoded response body for uri, raising urllib.error.HTTPError for error statuses."""
+        headers = dict(headers or {})
+        path = self._path(uri=uri, headers=headers)
+        meta, body = self._read(path=path)
+        if meta is not None and time.time() - meta['stored'] < self.ttl:
+            try:
+                os.utime(path)  # for least-recently-used eviction
+            except FileNotFoundError:  # evicted since it was read
+                meta = None
+            else:
+                self._count('hit')
+                return _decode(meta=meta, body=body)
+
+        request_headers = dict(headers)
+        request_headers['Accept-Encoding'] = 'gzip'
+        if meta is not None:
+            if meta.get('etag'):
+                request_headers['If-None-Match'] = meta['etag']
+            if meta.get('last-modified'):
+                request_headers['If-Modified-Since'] = meta['last-modified']
+        request = urllib.request.Request(uri, headers=request_headers)
+        _LOGGER.debug('retrieve {}'.format(uri))
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as f:
+                response_headers = f.headers
+                body = f.read()
+        except urllib.error.HTTPError as error:
+            if error.code != 304 or meta is None:
+                raise
+            self._count('revalidated')
+            meta['stored'] = time.time()
+            self._write(path=path, meta=meta, body=body)
+            return _decode(meta=meta, body=body)
+
+        self._count('miss')
+        self._count('downloaded bytes', len(body))
+        meta = {
+            'format': _FORMAT,
+            'uri': uri,
+            'stored': time.time(),
+            'etag': response_headers.get('ETag'),
+            'last-modified': response_headers.get('Last-Modified'),
+            'content-encoding': response_headers.get('Content-Encoding'),
+        }
+        self._write(path=path, meta=meta, body=body)
+        self._evict()
+        return _decode(meta=meta, body=body)
+
+    def get_json(self, uri, headers=None):
+        request_headers = {'Accept': 'application/json'}
+        request_headers.update(headers or {})
+        return json.load(codecs.getreader('utf-8')(io.BytesIO(self.get(uri=uri, headers=request_headers))))
+
+    def format_stats(self):
+        return ', '.join('{} {}'.format(count, kind) for kind, count in sorted(self.stats.items()))
+
+    def _count(self, kind, count=1):
+        with self._lock:
+            self.stats[kind] += count
+
+    def _path(self, uri, headers):
+        key = json.dumps([uri, sorted(headers.items())])
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest())
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except (OSError, ValueError):
+            return None, None
+        if meta.get('format') != _FORMAT:
+            return None, None
+        return meta, body
+
+    def _write(self, path, meta, body):
+        util.atomic_write(path=path, content=json.dumps(meta).encode('utf-8') + b'\n' + body)
+
+    def _evict(self):
+        with self._lock:
+            entries = []
+            total = 0
+            for entry in os.scandir(self.directory):
+                if entry.is_file() and not entry.name.startswith('.'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                total -= size
+                self.stats['evicted'] += 1
+
+
+def _decode(meta, body):
+    if meta.get('content-encoding') == 'gzip':
+        return gzip.decompress(body)
+    return body
+
+
+DEFAULT_HTTP_CACHE = HTTPCache()
+
+
+class _Response(io.BytesIO):
+    def __init__(self, body, headers=None):
+        super().__init__(body)
+        self.headers = headers or {}
+
+
+class TestHTTPCache(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = HTTPCache(directory=directory.name)
+        self.requests = []
+        self.responses = []
+        patcher = unittest.mock.patch.object(urllib.request, 'urlopen', self.urlopen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def urlopen(self, request, timeout=None):
+        self.requests.append(dict(request.header_items()))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def test_hit_and_miss(self):
+        self.responses.append(_Response(gzip.compress(b'{"nodes": []}'), headers={'Content-Encoding': 'gzip'}))
+        self.assertEqual(self.cache.get_json(uri='https://example.com/graph'), {'nodes': []})
+        self.assertEqual(self.cache.get_json(uri='https://example.com/graph'), {'nodes': []})
+        self.assertEqual(len(self.requests), 1)
+        self.assertEqual(self.requests[0]['Accept-encoding'], 'gzip')
+        self.assertEqual(self.cache.stats['miss'], 1)
+        self.assertEqual(self.cache.stats['hit'], 1)
+
+    def test_ttl(self):
+        self.responses.append(_Response(b'a', headers={'ETag': '"1"'}))
+        self.responses.append(_Response(b'b'))
+        self.cache.ttl = 0
+        self.assertEqual(self.cache.get(uri='https://example.com/graph'), b'a')
+        self.assertEqual(self.cache.get(uri='https://example.com/graph'), b'b')
+        self.assertEqual(self.requests[1]['If-none-match'], '"1"')
+        self.assertEqual(self.cache.stats['miss'], 2)
+
+    def test_not_modified(self):
+        self.responses.append(_Response(b'a', headers={'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'}))
+        self.responses.append(urllib.error.HTTPError('https://example.com/graph', 304, 'Not Modified', {}, None))
+        self.cache.ttl = 0
+        self.assertEqual(self.cache.get(uri='https://example.com/graph'), b'a')
+        self.assertEqual(self.cache.get(uri='https://example.com/graph'), b'a')
+        self.assertEqual(self.requests[1]['If-modified-since'], 'Mon, 01 Jan 2024 00:00:00 GMT')
+        self.assertEqual(self.cache.stats['revalidated'], 1)
+
+    def test_evict(self):
+        self.responses.extend([_Response(b'a' * 10), _Response(b'b' * 10), _Response(b'a' * 10)])
+        self.cache.get(uri='https://example.com/a')
+        path = self.cache._path(uri='https://example.com/a', headers={})
+        os.utime(path, (0, 0))  # least recently used
+        self.cache.max_bytes = os.path.getsize(path) + 1
+        self.cache.get(uri='https://example.com/b')
+        self.assertEqual(self.cache.stats['evicted'], 1)
+        self.assertFalse(os.path.exists(path))
+        self.cache.get(uri='https://example.com/a')
+        self.assertEqual(self.cache.stats['miss'], 3)
+
+    def test_evicted_during_hit(self):
+        self.responses.extend([_Response(b'a'), _Response(b'b')])
+        self.cache.get(uri='https://example.com/graph')
+        with unittest.mock.patch.object(os, 'utime', side_effect=FileNotFoundError):
+            self.assertEqual(self.cache.get(uri='https://example.com/graph'), b'b')
+        self.assertEqual(self.cache.stats['hit'], 0)
@@ -0,0 +1,194 @@
+# Release-image metadata storage for the hack tools.
+
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import yaml
+
+import util
+
+
+_LOGGER = logging.getLogger(__name__)
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS releases (
+    digest TEXT PRIMARY KEY,
+    version TEXT,
+    architecture TEXT,
+    metadata TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS releases_version_architecture ON releases (version, architecture);
+CREATE TABLE IF NOT EXISTS empty_layers (
+    digest TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS settings (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+_LOOKUP_CHUNK_SIZE = 500
+
+
+def get_architecture(meta):
+    return meta['image-config-data']['architecture']
+
+
+class NodeStore(object):
+    """Packed store of release metadata, keyed by manifest digest.
+
+    Metadata is kept in a single SQLite database, indexed by version and
+    architecture, so a whole channel can be read in one query.  Manifests
+    which are not usable release images are stored as negative entries
+    with empty metadata, so they are not retrieved again, and layers
+    without release metadata are remembered by digest, so base layers shared
+    between images are only retrieved once.  Each put is committed
+    atomically.
+    """
+    def __init__(self, path='.nodes.sqlite'):
+        self.path = path
+        self._connection = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        if self._connection is not None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        with self._connection:
+            self._connection.executescript(_SCHEMA)
+
+    def close(self):
+        if self._connection is None:
+            return
+        self._connection.close()
+        self._connection = None
+
+    def get(self, digest):
+        """Return the metadata for digest ({} for negative entries), raising KeyError if it is not stored."""
+        row = self._connection.execute('SELECT metadata FROM releases WHERE digest = ?', (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        return json.loads(row[0])
+
+    def put(self, digest, meta):
+        """Store metadata for digest.  Empty metadata records that digest is not a usable release image."""
+        with self._connection:
+            self._put(digest=digest, meta=meta)
+
+    def _put(self, digest, meta, replace=True):
+        version = architecture = None
+        if meta:
+            version = meta['version']
+            architecture = get_architecture(meta=meta)
+        self._connection.execute(
+            'INSERT OR {} INTO releases (digest, version, architecture, metadata) VALUES (?, ?, ?, ?)'.format('REPLACE' if replace else 'IGNORE'),
+            (digest, version, architecture, json.dumps(meta, sort_keys=True)),
+        )
+
+    def lookup(self, versions, architecture):
+        """Return {version: (digest, meta)} for the stored releases matching versions and architecture.
+
+        When several digests share a version and architecture, the first stored wins.
+        """
+        versions = sorted(set(versions))
+        found = {}
+        for i in range(0, len(versions), _LOOKUP_CHUNK_SIZE):
+            chunk = versions[i:i + _LOOKUP_CHUNK_SIZE]
+            rows = self._connection.execute(
+                'SELECT version, digest, metadata FROM releases WHERE architecture = ? AND version IN ({}) ORDER BY rowid'.format(', '.join('?' * len(chunk))),
+                [architecture] + chunk,
+            )
+            for version, digest, metadata in rows:
+                if version not in found:
+                    found[version] = (digest, json.loads(metadata))
+        return found
+
+    def empty_layers(self):
+        """Return the set of layer digests known to contain no release metadata."""
+        return set(digest for digest, in self._connection.execute('SELECT digest FROM empty_layers'))
+
+    def add_empty_layers(self, digests):
+        """Record layer digests which contain no release metadata, so they are not retrieved again."""
+        with self._connection:
+            self._connection.executemany('INSERT OR IGNORE INTO empty_layers (digest) VALUES (?)', ((digest,) for digest in digests))
+
+    def __len__(self):
+        return self._connection.execute('SELECT COUNT(*) FROM releases').fetchone()[0]
+
+    def migrate(self, directory='.nodes'):
+        """Import metadata from the legacy one-YAML-file-per-digest cache directory, once per directory."""
+        key = 'migrated:{}'.format(os.path.abspath(directory))
+        if not os.path.isdir(directory) or self._connection.execute('SELECT 1 FROM settings WHERE key = ?', (key,)).fetchone():
+            return
+        count = 0
+        with self._connection:
+            for root, _, files in os.walk(directory):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    with open(path) as f:
+                        try:
+                            meta = yaml.load(f, Loader=util.FAST_SAFE_LOADER)
+                        except ValueError as error:
+                            raise ValueError('failed to load YAML from {}: {}'.format(path, error))
+                    if meta and (not isinstance(meta, dict) or 'version' not in meta):
+                        continue
+                    self._put(digest='{}:{}'.format(os.path.basename(root), filename), meta=meta or {}, replace=False)
+                    count += 1
+            self._connection.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)', (key, str(count)))
+        _LOGGER.info('migrated {} cached release metadata entries from {} to {}'.format(count, directory, self.path))
+
+
+class TestNodeStore(unittest.TestCase):
+    def meta(self, version, architecture='amd64'):
+        return {'version': version, 'image-config-data': {'architecture': architecture}}
+
+    def test_lookup(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with NodeStore(path=os.path.join(directory, 'nodes.sqlite')) as store:
+                store.put(digest='sha256:1', meta=self.meta('4.16.0'))
+                store.put(digest='sha256:2', meta=self.meta('4.16.0'))
+                store.put(digest='sha256:3', meta=self.meta('4.16.0', architecture='arm64'))
+                store.put(digest='sha256:4', meta={})
+                store.add_empty_layers(digests=['sha256:5', 'sha256:6'])
+                store.add_empty_layers(digests=['sha256:5'])
+
+                self.assertEqual(store.lookup(versions=['4.16.0', '4.16.1'], architecture='amd64'), {'4.16.0': ('sha256:1', self.meta('4.16.0'))})
+                self.assertEqual(store.lookup(versions=['4.16.0'], architecture='arm64'), {'4.16.0': ('sha256:3', self.meta('4.16.0', architecture='arm64'))})
+                self.assertEqual(store.get(digest='sha256:4'), {})  # negative entry
+                with self.assertRaises(KeyError):
+                    store.get(digest='sha256:5')
+                self.assertEqual(len(store), 4)
+                self.assertEqual(store.empty_layers(), {'sha256:5', 'sha256:6'})
+
+    def test_migrate(self):
+        with tempfile.TemporaryDirectory() as directory:
+            legacy = os.path.join(directory, 'nodes')
+            os.makedirs(os.path.join(legacy, 'sha256'))
+            for filename, content in [('1', 'version: 4.16.0\nimage-config-data:\n  architecture: amd64\n'), ('2', ''), ('3', 'unrelated: true\n')]:
+                with open(os.path.join(legacy, 'sha256', filename), 'w') as f:
+                    f.write(content)
+            with NodeStore(path=os.path.join(directory, 'nodes.sqlite')) as store:
+                store.put(digest='sha256:1', meta=self.meta('4.16.1'))  # entries already stored win
+                store.migrate(directory=legacy)
+                self.assertEqual(store.get(digest='sha256:1'), self.meta('4.16.1'))
+                self.assertEqual(store.get(digest='sha256:2'), {})
+                with self.assertRaises(KeyError):
+                    store.get(digest='sha256:3')
+
+                with open(os.path.join(legacy, 'sha256', '4'), 'w') as f:
+                    f.write('version: 4.16.2\nimage-config-data:\n  architecture: amd64\n')
+                store.migrate(directory=legacy)  # each directory is only migrated once
+                with self.assertRaises(KeyError):
+                    store.get(digest='sha256:4')
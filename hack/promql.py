@@ -0,0 +1,583 @@
+# PromQL parsing for validating and analyzing blocked-edges matchingRules.
+#
+# This covers the PromQL expression grammar:
+# https://prometheus.io/docs/prometheus/latest/querying/basics/
+# Parsed expressions are cached, and can be formatted canonically, so
+# equivalent expressions (differing in whitespace, redundant parentheses,
+# label matcher order, and similar) compare equal.
+
+import collections
+import functools
+import json
+import re
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+try:
+    import re2  # google-re2, for checking label matcher regular expressions with Prometheus' RE2 syntax
+except ImportError:
+    re2 = None
+
+
+NumberLiteral = collections.namedtuple('NumberLiteral', ['value'])
+StringLiteral = collections.namedtuple('StringLiteral', ['value'])
+VectorSelector = collections.namedtuple('VectorSelector', ['name', 'matchers'])
+MatrixSelector = collections.namedtuple('MatrixSelector', ['vector', 'range'])
+Subquery = collections.namedtuple('Subquery', ['expr', 'range', 'step'])
+Offset = collections.namedtuple('Offset', ['expr', 'offset'])
+At = collections.namedtuple('At', ['expr', 'at'])
+Call = collections.namedtuple('Call', ['function', 'args'])
+Aggregation = collections.namedtuple('Aggregation', ['op', 'grouping', 'param', 'expr'])
+Unary = collections.namedtuple('Unary', ['op', 'expr'])
+Binary = collections.namedtuple('Binary', ['op', 'lhs', 'rhs', 'bool', 'matching', 'group'])
+
+AGGREGATIONS = {'avg', 'bottomk', 'count', 'count_values', 'group', 'limit_ratio', 'limitk', 'max', 'min', 'quantile', 'stddev', 'stdvar', 'sum', 'topk'}
+PARAMETERIZED_AGGREGATIONS = {'bottomk', 'count_values', 'limit_ratio', 'limitk', 'quantile', 'topk'}
+FUNCTIONS = {
+    'abs', 'absent', 'absent_over_time', 'acos', 'acosh', 'asin', 'asinh', 'atan', 'atanh', 'avg_over_time',
+    'ceil', 'changes', 'clamp', 'clamp_max', 'clamp_min', 'cos', 'cosh', 'count_over_time',
+    'day_of_month', 'day_of_week', 'day_of_year', 'days_in_month', 'deg', 'delta', 'deriv',
+    'double_exponential_smoothing', 'exp', 'floor', 'histogram_avg', 'histogram_count', 'histogram_fraction',
+    'histogram_quantile', 'histogram_stddev', 'histogram_stdvar', 'histogram_sum', 'holt_winters', 'hour',
+    'idelta', 'increase', 'irate', 'label_join', 'label_replace', 'last_over_time', 'ln', 'log10', 'log2',
+    'mad_over_time', 'max_over_time', 'min_over_time', 'minute', 'month', 'pi', 'predict_linear',
+    'present_over_time', 'quantile_over_time', 'rad', 'rate', 'resets', 'round', 'scalar', 'sgn', 'sin', 'sinh',
+    'sort', 'sort_by_label', 'sort_by_label_desc', 'sort_desc', 'sqrt', 'stddev_over_time', 'stdvar_over_time',
+    'sum_over_time', 'tan', 'tanh', 'time', 'timestamp', 'vector', 'year',
+}
+BINARY_PRECEDENCE = [
+    {'or'},
+    {'and', 'unless'},
+    {'==', '!=', '<=', '<', '>=', '>'},
+    {'+', '-'},
+    {'*', '/', '%', 'atan2'},
+]
+COMPARISONS = BINARY_PRECEDENCE[2]
+SET_OPERATIONS = BINARY_PRECEDENCE[0] | BINARY_PRECEDENCE[1]
+
+_DURATION_UNITS = [('y', 365 * 24 * 60 * 60 * 1000), ('w', 7 * 24 * 60 * 60 * 1000), ('d', 24 * 60 * 60 * 1000), ('h', 60 * 60 * 1000), ('m', 60 * 1000), ('s', 1000), ('ms', 1)]
+_DURATION_REGEXP = re.compile(r'(\d+)(ms|[smhdwy])')
+_TOKEN_REGEXP = re.compile(r'''
+    (?P<space>\s+|\#[^\n]*)
+  | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*'|`[^`]*`)
+  | (?P<duration>(?:\d+(?:ms|[smhdwy]))+)(?!\w)
+  | (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<identifier>[a-zA-Z_:][a-zA-Z0-9_:]*)
+  | (?P<operator>==|!=|<=|>=|=~|!~|[-+*/%^<>=(){}\[\],:@])
+''', re.VERBOSE)
+
+_PYTHON_ONLY_REGEXP_OPCODES = {
+    sre_parse.ASSERT: 'lookaround assertion',
+    sre_parse.ASSERT_NOT: 'lookaround assertion',
+    sre_parse.GROUPREF: 'backreference',
+    sre_parse.GROUPREF_EXISTS: 'conditional group',
+}
+for _name, _description in [('ATOMIC_GROUP', 'atomic group'), ('POSSESSIVE_REPEAT', 'possessive repetition')]:  # Python >= 3.11
+    if hasattr(sre_parse, _name):
+        _PYTHON_ONLY_REGEXP_OPCODES[getattr(sre_parse, _name)] = _description
+
+
+@functools.lru_cache(maxsize=4096)
+def parse(expression):
+    """Return the abstract syntax tree for a PromQL expression, raising ValueError if it is invalid.
+
+    Results are cached by expression text.  Label matcher regular
+    expressions are only checked here when google-re2 is installed (see
+    regexp_warnings).
+    """
+    return _Parser(expression).parse()
+
+
+def canonical(expression):
+    """Return a canonical string for a PromQL expression (or already-parsed tree)."""
+    if isinstance(expression, str):
+        expression = parse(expression)
+    return _format(expression)
+
+
+def duration_milliseconds(duration):
+    milliseconds = 0
+    position = 0
+    for match in _DURATION_REGEXP.finditer(duration):
+        if match.start() != position:
+            break
+        milliseconds += int(match.group(1)) * dict(_DURATION_UNITS)[match.group(2)]
+        position = match.end()
+    if position != len(duration) or not duration:
+        raise ValueError('invalid duration {!r}'.format(duration))
+    return milliseconds
+
+
+def format_duration(milliseconds):
+    if milliseconds == 0:
+        return '0s'
+    parts = []
+    for unit, size in _DURATION_UNITS:
+        count, milliseconds = divmod(milliseconds, size)
+        if count:
+            parts.append('{}{}'.format(count, unit))
+    return ''.join(parts)
+
+
+def regexp_warnings(tree):
+    """Yield descriptions of label matcher regular expressions in tree which Prometheus may reject.
+
+    Prometheus uses RE2 syntax, which differs from Python's re: RE2
+    accepts \\pL, and rejects backreferences and lookarounds.  Without
+    google-re2, parse cannot check label matchers, so they are checked
+    here with Python's re instead, and the results are only advisory.
+    """
+    if re2 is not None:
+        return  # parse already rejected invalid expressions
+    for node in walk(tree):
+        if not isinstance(node, VectorSelector):
+            continue
+        for label, op, value in node.matchers:
+            if op not in ('=~', '!~'):
+                continue
+            try:
+                constructs = set(_python_only_constructs(sre_parse.parse(value)))
+            except re.error as error:
+                yield 'Python cannot check regular expression {!r} for label {}: {}'.format(value, label, error)
+                continue
+            if constructs:
+                yield 'regular expression {!r} for label {} uses {}, which RE2 does not support'.format(value, label, ', '.join(sorted(constructs)))
+
+
+def _python_only_constructs(parsed):
+    for op, av in parsed:
+        if op in _PYTHON_ONLY_REGEXP_OPCODES:
+            yield _PYTHON_ONLY_REGEXP_OPCODES[op]
+        if isinstance(av, (list, tuple)):
+            for item in av:
+                if isinstance(item, sre_parse.SubPattern):
+                    yield from _python_only_constructs(item)
+                elif isinstance(item, (list, tuple)):
+                    for sub in item:
+                        if isinstance(sub, sre_parse.SubPattern):
+                            yield from _python_only_constructs(sub)
+        elif isinstance(av, sre_parse.SubPattern):
+            yield from _python_only_constructs(av)
+
+
+def walk(tree):
+    """Yield every node in tree, parents before children."""
+    yield tree
+    if isinstance(tree, (MatrixSelector,)):
+        yield from walk(tree.vector)
+    elif isinstance(tree, (Subquery, Offset, At, Unary)):
+        yield from walk(tree.expr)
+    elif isinstance(tree, Call):
+        for arg in tree.args:
+            yield from walk(arg)
+    elif isinstance(tree, Aggregation):
+        if tree.param is not None:
+            yield from walk(tree.param)
+        yield from walk(tree.expr)
+    elif isinstance(tree, Binary):
+        yield from walk(tree.lhs)
+        yield from walk(tree.rhs)
+
+
+def cost_hints(tree, max_range='1h'):
+    """Yield descriptions of potentially expensive constructs in tree.
+
+    Selectors whose only label matchers are empty-string equality (like
+    the _id="" used for Telemetry compatibility) select every series of
+    their metric on the cluster, and ranges longer than max_range
+    evaluate many samples per series.
+    """
+    max_range = duration_milliseconds(max_range)
+    for node in walk(tree):
+        if isinstance(node, VectorSelector):
+            if all(op == '=' and value == '' for label, op, value in node.matchers):
+                yield 'unbounded selector {}'.format(_format(node))
+        elif isinstance(node, MatrixSelector) and node.range > max_range:
+            yield 'range [{}] over {}'.format(format_duration(node.range), _format(node.vector))
+        elif isinstance(node, Subquery) and node.range > max_range:
+            yield 'subquery range [{}] over {}'.format(format_duration(node.range), _format(node.expr))
+
+
+class _Parser(object):
+    def __init__(self, expression):
+        self.expression = expression
+        self.tokens = []
+        position = 0
+        in_brackets = False
+        while position < len(expression):
+            if in_brackets and expression[position] == ':':  # as in Prometheus' lexer, so [5m:1m] is not read as an identifier ':1m'
+                self.tokens.append(('operator', ':', position))
+                position += 1
+                continue
+            match = _TOKEN_REGEXP.match(expression, position)
+            if not match:
+                raise ValueError('unexpected character {!r} at position {}'.format(expression[position], position))
+            if match.lastgroup != 'space':
+                self.tokens.append((match.lastgroup, match.group(), position))
+                if match.lastgroup == 'operator' and match.group() in '[]':
+                    in_brackets = match.group() == '['
+            position = match.end()
+        self.tokens.append(('end', '', len(expression)))
+        self.index = 0
+
+    def peek(self, offset=0):
+        return self.tokens[min(self.index + offset, len(self.tokens) - 1)]
+
+    def next(self):
+        token = self.tokens[self.index]
+        if token[0] != 'end':
+            self.index += 1
+        return token
+
+    def accept(self, value):
+        token = self.peek()
+        if token[0] in ('operator', 'identifier') and token[1] == value:
+            return self.next()
+        return None
+
+    def expect(self, value):
+        token = self.accept(value)
+        if token is None:
+            self.fail('expected {!r}'.format(value))
+        return token
+
+    def fail(self, message):
+        kind, value, position = self.peek()
+        found = 'end of input' if kind == 'end' else repr(value)
+        raise ValueError('{} at position {}, found {}'.format(message, position, found))
+
+    def parse(self):
+        tree = self.parse_binary(0)
+        if self.peek()[0] != 'end':
+            self.fail('unexpected token')
+        return tree
+
+    def parse_binary(self, level):
+        if level == len(BINARY_PRECEDENCE):
+            return self.parse_unary()
+        lhs = self.parse_binary(level + 1)
+        while True:
+            kind, value, _ = self.peek()
+            if kind not in ('operator', 'identifier') or value not in BINARY_PRECEDENCE[level]:
+                return lhs
+            self.next()
+            return_bool, matching, group = self.parse_binary_modifiers(op=value)
+            rhs = self.parse_binary(level + 1)
+            lhs = Binary(value, lhs, rhs, return_bool, matching, group)
+
+    def parse_binary_modifiers(self, op):
+        return_bool = False
+        if op in COMPARISONS and self.accept('bool'):
+            return_bool = True
+        matching = None
+        for keyword in ['on', 'ignoring']:
+            if self.accept(keyword):
+                matching = (keyword, self.parse_labels())
+                break
+        group = None
+        for keyword in ['group_left', 'group_right']:
+            if self.accept(keyword):
+                if op in SET_OPERATIONS:
+                    self.fail('{} is not allowed for set operation {!r}'.format(keyword, op))
+                labels = ()
+                if self.peek()[1] == '(':
+                    labels = self.parse_labels()
+                group = (keyword, labels)
+                break
+        return return_bool, matching, group
+
+    def parse_unary(self):
+        for op in ['-', '+']:
+            if self.accept(op):
+                return Unary(op, self.parse_unary())
+        base = self.parse_postfix()
+        if self.accept('^'):
+            return_bool, matching, group = self.parse_binary_modifiers(op='^')
+            return Binary('^', base, self.parse_unary(), return_bool, matching, group)
+        return base
+
+    def parse_postfix(self):
+        tree = self.parse_primary()
+        while True:
+            if self.accept('['):
+                range_ms = self.parse_duration()
+                if self.accept(':'):
+                    step = None
+                    if self.peek()[0] == 'duration':
+                        step = self.parse_duration()
+                    self.expect(']')
+                    tree = Subquery(tree, range_ms, step)
+                else:
+                    self.expect(']')
+                    if not isinstance(tree, VectorSelector):
+                        self.fail('ranges are only allowed for vector selectors')
+                    tree = MatrixSelector(tree, range_ms)
+            elif self.accept('offset'):
+                sign = -1 if self.accept('-') else 1
+                tree = Offset(tree, sign * self.parse_duration())
+            elif self.accept('@'):
+                kind, value, _ = self.peek()
+                if kind == 'identifier' and value in ('start', 'end'):
+                    self.next()
+                    self.expect('(')
+                    self.expect(')')
+                    tree = At(tree, '{}()'.format(value))
+                else:
+                    tree = At(tree, self.parse_number())
+            else:
+                return tree
+
+    def parse_duration(self):
+        kind, value, _ = self.peek()
+        if kind != 'duration':
+            self.fail('expected duration')
+        self.next()
+        return duration_milliseconds(value)
+
+    def parse_number(self):
+        sign = -1 if self.accept('-') else 1
+        kind, value, _ = self.peek()
+        if kind == 'number':
+            self.next()
+            if value.lower().startswith('0x'):
+                return sign * float(int(value, 16))
+            return sign * float(value)
+        if kind == 'identifier' and value.lower() in ('inf', 'nan'):
+            self.next()
+            return sign * float(value)
+        self.fail('expected number')
+
+    def parse_primary(self):
+        kind, value, _ = self.peek()
+        if kind == 'number' or (kind == 'identifier' and value.lower() in ('inf', 'nan') and self.peek(1)[1] != '{'):
+            return NumberLiteral(self.parse_number())
+        if kind == 'duration':
+            self.next()
+            return NumberLiteral(duration_milliseconds(value) / 1000.0)
+        if kind == 'string':
+            self.next()
+            return StringLiteral(_unquote(value))
+        if value == '(' and kind == 'operator':
+            self.next()
+            tree = self.parse_binary(0)
+            self.expect(')')
+            return tree
+        if value == '{' and kind == 'operator':
+            return self.parse_selector(name=None)
+        if kind == 'identifier':
+            self.next()
+            if value in AGGREGATIONS and (self.peek()[1] in ('(', 'by', 'without')):
+                return self.parse_aggregation(op=value)
+            if self.peek()[1] == '(' and self.peek()[0] == 'operator':
+                if value not in FUNCTIONS:
+                    self.fail('unrecognized function {!r}'.format(value))
+                return Call(value, tuple(self.parse_arguments()))
+            return self.parse_selector(name=value)
+        self.fail('unexpected token')
+
+    def parse_aggregation(self, op):
+        grouping = self.parse_grouping()
+        args = self.parse_arguments()
+        if grouping is None:
+            grouping = self.parse_grouping()
+        expected = 2 if op in PARAMETERIZED_AGGREGATIONS else 1
+        if len(args) != expected:
+            self.fail('{} takes {} argument{}, not {}'.format(op, expected, '' if expected == 1 else 's', len(args)))
+        param = args[0] if expected == 2 else None
+        return Aggregation(op, grouping, param, args[-1])
+
+    def parse_grouping(self):
+        for keyword in ['by', 'without']:
+            if self.accept(keyword):
+                return (keyword, self.parse_labels())
+        return None
+
+    def parse_arguments(self):
+        self.expect('(')
+        args = []
+        if not self.accept(')'):
+            while True:
+                args.append(self.parse_binary(0))
+                if self.accept(')'):
+                    break
+                self.expect(',')
+        return args
+
+    def parse_labels(self):
+        self.expect('(')
+        labels = []
+        while not self.accept(')'):
+            kind, value, _ = self.peek()
+            if kind != 'identifier':
+                self.fail('expected label name')
+            self.next()
+            labels.append(value)
+            if not self.accept(','):
+                self.expect(')')
+                break
+        return tuple(labels)
+
+    def parse_selector(self, name):
+        matchers = []
+        if self.accept('{'):
+            while not self.accept('}'):
+                kind, label, _ = self.peek()
+                if kind != 'identifier':
+                    self.fail('expected label name')
+                self.next()
+                kind, op, _ = self.peek()
+                if op not in ('=', '!=', '=~', '!~'):
+                    self.fail('expected label matching operator')
+                self.next()
+                kind, value, _ = self.peek()
+                if kind != 'string':
+                    self.fail('expected label value string')
+                self.next()
+                value = _unquote(value)
+                if op in ('=~', '!~') and re2 is not None:
+                    try:
+                        re2.compile(value)
+                    except re2.error as error:
+                        self.fail('invalid regular expression {!r} for label {}: {}'.format(value, label, error))
+                matchers.append((label, op, value))
+                if not self.accept(','):
+                    self.expect('}')
+                    break
+        if name is None:
+            names = [value for label, op, value in matchers if label == '__name__' and op == '=']
+            if len(names) == 1:
+                name = names[0]
+                matchers = [matcher for matcher in matchers if matcher != ('__name__', '=', name)]
+            elif all(_matches_empty(op=op, value=value) for label, op, value in matchers):
+                self.fail('vector selector must contain at least one matcher which does not match the empty string')
+        return VectorSelector(name, tuple(sorted(set(matchers))))
+
+
+def _matches_empty(op, value):
+    if op == '=':
+        return value == ''
+    if op == '!=':
+        return value != ''
+    try:
+        matches = (re2 or re).fullmatch(value, '') is not None
+    except re.error:
+        return False  # not a Python regular expression; see regexp_warnings
+    if op == '=~':
+        return matches
+    return not matches
+
+
+_SIMPLE_ESCAPES = {'a': '\a', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v', '\\': '\\'}
+_HEX_ESCAPE_DIGITS = {'x': 2, 'u': 4, 'U': 8}
+
+
+def _unquote(token):
+    """Unquote a string literal the way Prometheus does, with Go's escape sequences.
+
+    \\xHH and octal \\NNN escapes are bytes, so the unquoted bytes must be valid UTF-8.
+    """
+    quote, body = token[0], token[1:-1]
+    if quote == '`':
+        return body
+    value = bytearray()
+    index = 0
+    try:
+        while index < len(body):
+            char = body[index]
+            if char == quote or char == '\n':
+                raise ValueError('unescaped {!r}'.format(char))
+            if char != '\\':
+                value.extend(char.encode('utf-8'))
+                index += 1
+                continue
+            escape = body[index + 1:index + 2]
+            if escape in _SIMPLE_ESCAPES:
+                value.extend(_SIMPLE_ESCAPES[escape].encode('utf-8'))
+                index += 2
+            elif escape == quote:
+                value.extend(quote.encode('utf-8'))
+                index += 2
+            elif escape in _HEX_ESCAPE_DIGITS:
+                digits = body[index + 2:index + 2 + _HEX_ESCAPE_DIGITS[escape]]
+                if len(digits) != _HEX_ESCAPE_DIGITS[escape] or not re.fullmatch('[0-9a-fA-F]+', digits):
+                    raise ValueError('invalid \\{} escape'.format(escape))
+                code = int(digits, 16)
+                if escape == 'x':
+                    value.append(code)
+                elif code > 0x10FFFF or 0xD800 <= code < 0xE000:
+                    raise ValueError('invalid code point \\{}{}'.format(escape, digits))
+                else:
+                    value.extend(chr(code).encode('utf-8'))
+                index += 2 + len(digits)
+            elif escape and escape in '01234567':
+                digits = body[index + 1:index + 4]
+                if not re.fullmatch('[0-7]{3}', digits) or int(digits, 8) > 255:
+                    raise ValueError('invalid octal escape \\{}'.format(digits))
+                value.append(int(digits, 8))
+                index += 4
+            else:
+                raise ValueError('unknown escape sequence \\{}'.format(escape))
+        return value.decode('utf-8')
+    except ValueError as error:
+        raise ValueError('invalid string literal {}: {}'.format(token, error))
+
+
+def _format_number(value):
+    text = repr(float(value))
+    if text.endswith('.0'):
+        text = text[:-2]
+    return text
+
+
+def _format_labels(labels):
+    return '({})'.format(', '.join(sorted(labels)))
+
+
+def _format(tree):
+    if isinstance(tree, NumberLiteral):
+        return _format_number(tree.value)
+    if isinstance(tree, StringLiteral):
+        return json.dumps(tree.value)
+    if isinstance(tree, VectorSelector):
+        matchers = ', '.join('{}{}{}'.format(label, op, json.dumps(value)) for label, op, value in tree.matchers)
+        if tree.name is None:
+            return '{{{}}}'.format(matchers)
+        if not matchers:
+            return tree.name
+        return '{}{{{}}}'.format(tree.name, matchers)
+    if isinstance(tree, MatrixSelector):
+        return '{}[{}]'.format(_format(tree.vector), format_duration(tree.range))
+    if isinstance(tree, Subquery):
+        step = format_duration(tree.step) if tree.step is not None else ''
+        return '({})[{}:{}]'.format(_format(tree.expr), format_duration(tree.range), step)
+    if isinstance(tree, Offset):
+        return '({} offset {})'.format(_format(tree.expr), format_duration(tree.offset) if tree.offset >= 0 else '-' + format_duration(-tree.offset))
+    if isinstance(tree, At):
+        return '({} @ {})'.format(_format(tree.expr), tree.at if isinstance(tree.at, str) else _format_number(tree.at))
+    if isinstance(tree, Call):
+        return '{}({})'.format(tree.function, ', '.join(_format(arg) for arg in tree.args))
+    if isinstance(tree, Aggregation):
+        grouping = ''
+        if tree.grouping is not None:
+            grouping = ' {} {}'.format(tree.grouping[0], _format_labels(tree.grouping[1]))
+        args = [_format(tree.expr)]
+        if tree.param is not None:
+            args.insert(0, _format(tree.param))
+        return '{}{} ({})'.format(tree.op, grouping, ', '.join(args))
+    if isinstance(tree, Unary):
+        if tree.op == '+':
+            return _format(tree.expr)
+        return '(-{})'.format(_format(tree.expr))
+    if isinstance(tree, Binary):
+        modifiers = []
+        if tree.bool:
+            modifiers.append('bool')
+        if tree.matching is not None:
+            modifiers.append('{} {}'.format(tree.matching[0], _format_labels(tree.matching[1])))
+        if tree.group is not None:
+            modifiers.append('{} {}'.format(tree.group[0], _format_labels(tree.group[1])))
+        return '({} {} {})'.format(_format(tree.lhs), ' '.join([tree.op] + modifiers), _format(tree.rhs))
+    raise ValueError('unrecognized PromQL node {!r}'.format(tree))
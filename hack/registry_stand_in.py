@@ -0,0 +1,379 @@
+# Local stand-in for the Quay registry APIs used by show-edges.py.
+#
+# It serves recorded (or synthesized) tag pages, manifests, config blobs,
+# and layers, so release metadata scraping can be tested and benchmarked
+# without network access.
+
+import collections
+import gzip
+import hashlib
+import http.server
+import io
+import json
+import logging
+import os
+import re
+import tarfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+
+
+_LOGGER = logging.getLogger(__name__)
+_TAGS_PATH_REGEXP = re.compile(r'^/api/v1/repository/(?P<name>[^/]+/[^/]+)/tag/$')
+_MANIFEST_PATH_REGEXP = re.compile(r'^/api/v1/repository/(?P<name>[^/]+/[^/]+)/manifest/(?P<digest>[^/]+)$')
+_BLOB_PATH_REGEXP = re.compile(r'^/v2/(?P<name>[^/]+/[^/]+)/blobs/(?P<digest>[^/]+)$')
+_CDN_PATH_REGEXP = re.compile(r'^/cdn/(?P<digest>[^/]+)$')
+_MANIFEST_LIST = 'application/vnd.docker.distribution.manifest.list.v2+json'
+_MANIFEST = 'application/vnd.docker.distribution.manifest.v2+json'
+_CONFIG = 'application/vnd.docker.container.image.v1+json'
+_LAYER = 'application/vnd.docker.image.rootfs.diff.tar.gzip'
+
+
+def digest(data):
+    return 'sha256:{}'.format(hashlib.sha256(data).hexdigest())
+
+
+def layer(files):
+    """Return a reproducible gzipped tarball holding files, a list of (name, bytes) tuples."""
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as gz:
+        with tarfile.open(fileobj=gz, mode='w') as tar:
+            for name, data in files:
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+
+class Fixture(object):
+    """Registry content: tag entries (newest first), manifests by digest, and blobs by digest."""
+    def __init__(self, tags=None, manifests=None, blobs=None):
+        self.tags = tags or []
+        self.manifests = manifests or {}
+        self.blobs = blobs or {}
+
+    def add_blob(self, data):
+        blob_digest = digest(data)
+        self.blobs[blob_digest] = data
+        return blob_digest
+
+    def add_manifest(self, manifest):
+        manifest_data = json.dumps(manifest, indent=3, sort_keys=True)
+        manifest_digest = digest(manifest_data.encode('utf-8'))
+        self.manifests[manifest_digest] = manifest_data
+        return manifest_digest
+
+    def add_tag(self, name, manifest_digest, **kwargs):
+        entry = {'name': name, 'manifest_digest': manifest_digest, 'reversion': False}
+        entry.update(kwargs)
+        self.tags.append(entry)
+
+    def save(self, directory):
+        for subdirectory in ['manifests', 'blobs']:
+            os.makedirs(os.path.join(directory, subdirectory), exist_ok=True)
+        with open(os.path.join(directory, 'tags.json'), 'w') as f:
+            json.dump(self.tags, f, indent=2)
+        for manifest_digest, manifest_data in self.manifests.items():
+            with open(os.path.join(directory, 'manifests', manifest_digest.replace(':', '_')), 'w') as f:
+                f.write(manifest_data)
+        for blob_digest, data in self.blobs.items():
+            with open(os.path.join(directory, 'blobs', blob_digest.replace(':', '_')), 'wb') as f:
+                f.write(data)
+
+    @classmethod
+    def load(cls, directory):
+        fixture = cls()
+        with open(os.path.join(directory, 'tags.json')) as f:
+            fixture.tags = json.load(f)
+        for filename in os.listdir(os.path.join(directory, 'manifests')):
+            with open(os.path.join(directory, 'manifests', filename)) as f:
+                fixture.manifests[filename.replace('_', ':', 1)] = f.read()
+        for filename in os.listdir(os.path.join(directory, 'blobs')):
+            with open(os.path.join(directory, 'blobs', filename), 'rb') as f:
+                fixture.blobs[filename.replace('_', ':', 1)] = f.read()
+        return fixture
+
+
+def synthesize(minors=range(10, 13), patches=20, architectures=('amd64', 'arm64'), multi=True, schema1_minors=(10,), base_layers=3):
+    """Return a Fixture with releases 4.{minor}.{patch} for each architecture.
+
+    Each release lists the earlier releases from its own and the preceding
+    minor as previous versions.  Releases share base layers without
+    release metadata.  Releases in
+    schema1_minors use schema-1 manifests, multi adds manifest-list releases,
+    and the fixture also includes an expired tag and a tag without release
+    metadata.
+    """
+    fixture = Fixture()
+    bases = [fixture.add_blob(layer([('usr/lib/base-{}'.format(i), 'base {}\n'.format(i).encode('utf-8') * 1024)])) for i in range(base_layers)]
+    configs = {}
+
+    def config(architecture):
+        if architecture not in configs:
+            configs[architecture] = fixture.add_blob(json.dumps({'architecture': architecture, 'os': 'linux'}).encode('utf-8'))
+        return configs[architecture]
+
+    def image(version, architecture, schema1):
+        minor, patch = (int(part) for part in version.split('.')[1:])
+        previous = ['4.{}.{}'.format(previous_minor, previous_patch) for previous_minor in minors for previous_patch in range(patches) if minor - 1 <= previous_minor and (previous_minor, previous_patch) < (minor, patch)]
+        metadata = json.dumps({'kind': 'cincinnati-metadata-v0', 'version': version, 'previous': previous, 'metadata': {}}).encode('utf-8')
+        payload = fixture.add_blob(layer([
+            ('release-manifests/image-references', json.dumps({'kind': 'ImageStream', 'metadata': {'name': version}}).encode('utf-8')),
+            ('release-manifests/release-metadata', metadata),
+        ]))
+        if schema1:
+            return fixture.add_manifest({
+                'schemaVersion': 1,
+                'architecture': architecture,
+                'fsLayers': [{'blobSum': blob} for blob in [payload] + list(reversed(bases))],
+                'history': [{'v1Compatibility': json.dumps({'architecture': architecture, 'os': 'linux'})}],
+            })
+        return fixture.add_manifest({
+            'schemaVersion': 2,
+            'mediaType': _MANIFEST,
+            'config': {'mediaType': _CONFIG, 'digest': config(architecture)},
+            'layers': [{'mediaType': _LAYER, 'digest': blob} for blob in bases + [payload]],
+        })
+
+    tags = []
+    for minor in minors:
+        for patch in range(patches):
+            version = '4.{}.{}'.format(minor, patch)
+            for architecture in architectures:
+                tags.append(('{}-{}'.format(version, architecture), image(version=version, architecture=architecture, schema1=minor in schema1_minors)))
+            if multi and minor not in schema1_minors:
+                manifests = [{'mediaType': _MANIFEST, 'digest': image(version=version, architecture=architecture, schema1=False), 'platform': {'architecture': architecture, 'os': 'linux'}} for architecture in architectures]
+                tags.append(('{}-multi'.format(version), fixture.add_manifest({'schemaVersion': 2, 'mediaType': _MANIFEST_LIST, 'manifests': manifests})))
+
+    tags.append(('base', fixture.add_manifest({
+        'schemaVersion': 2,
+        'mediaType': _MANIFEST,
+        'config': {'mediaType': _CONFIG, 'digest': config('amd64')},
+        'layers': [{'mediaType': _LAYER, 'digest': blob} for blob in bases],
+    })))
+    for name, manifest_digest in reversed(tags):
+        fixture.add_tag(name=name, manifest_digest=manifest_digest)
+    fixture.add_tag(name='expired', manifest_digest=tags[0][1], expiration='Thu, 01 Jan 2020 00:00:00 -0000')
+    return fixture
+
+
+def record(repository, pages=1):
+    """Return a Fixture recorded from the first pages of a live Quay repository.
+
+    Layers are trimmed to their release-manifests/ entries, so recordings
+    stay small.  The trimmed layers are stored under their original
+    digests, so that recorded manifests and tags are served unchanged, which
+    means served layers do not match their digests, and clients which
+    verify blob digests will reject them.  Synthesized fixtures do not have
+    this limitation.
+    """
+    host, name = repository.split('/', 1)
+    base = 'https://{}'.format(host)
+
+    def get(uri):
+        _LOGGER.info('record {}'.format(uri))
+        return urllib.request.urlopen(uri)
+
+    fixture = Fixture()
+
+    def record_manifest(manifest_digest):
+        with get('{}/api/v1/repository/{}/manifest/{}'.format(base, name, manifest_digest)) as f:
+            manifest_data = json.load(f)['manifest_data']
+        fixture.manifests[manifest_digest] = manifest_data
+        manifest = json.loads(manifest_data)
+        if manifest.get('mediaType') == _MANIFEST_LIST:
+            record_manifest(manifest['manifests'][0]['digest'])
+            return
+        blobs = [entry['digest'] for entry in manifest.get('layers', [])] + [entry['blobSum'] for entry in manifest.get('fsLayers', [])]
+        if 'config' in manifest:
+            with get('{}/v2/{}/blobs/{}'.format(base, name, manifest['config']['digest'])) as f:
+                fixture.blobs[manifest['config']['digest']] = f.read()
+        for blob in blobs:
+            if blob in fixture.blobs:
+                continue
+            files = []
+            with get('{}/v2/{}/blobs/{}'.format(base, name, blob)) as f:
+                with tarfile.open(fileobj=f, mode='r|gz') as tar:
+                    for member in tar:
+                        member_name = member.name[2:] if member.name.startswith('./') else member.name
+                        if member.isfile() and member_name.startswith('release-manifests/'):
+                            files.append((member.name, tar.extractfile(member).read()))
+            fixture.blobs[blob] = layer(files)
+
+    for page in range(1, pages + 1):
+        with get('{}/api/v1/repository/{}/tag/?page={}'.format(base, name, page)) as f:
+            data = json.load(f)
+        for entry in data['tags']:
+            fixture.tags.append(entry)
+            if 'expiration' not in entry and entry['manifest_digest'] not in fixture.manifests:
+                record_manifest(entry['manifest_digest'])
+        if not data['has_additional']:
+            break
+    return fixture
+
+
+class RegistryStandIn(http.server.ThreadingHTTPServer):
+    """Serve a Fixture over HTTP/1.1 keep-alive connections, with optional per-request latency.
+
+    Any repository name serves the same fixture.  Blob requests redirect to
+    a /cdn/ path, as Quay redirects to its CDN.  requests counts the
+    requests served for tags, manifests, blobs, and unknown paths.
+    """
+    daemon_threads = True
+
+    def __init__(self, fixture, address=('127.0.0.1', 0), page_size=50, latency=0):
+        self.fixture = fixture
+        self.page_size = page_size
+        self.latency = latency
+        self.requests = collections.Counter()
+        self._lock = threading.Lock()
+        super().__init__(address, _Handler)
+
+    @property
+    def host(self):
+        return '{}:{}'.format(*self.server_address[:2])
+
+    def start(self):
+        """Serve from a daemon thread, returning the thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def tag_page(self, page):
+        start = (page - 1) * self.page_size
+        return {
+            'tags': self.fixture.tags[start:start + self.page_size],
+            'page': page,
+            'has_additional': start + self.page_size < len(self.fixture.tags),
+        }
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True  # headers and body are written separately, which stalls keep-alive clients on delayed ACKs
+
+    def log_message(self, format, *args):
+        _LOGGER.debug(format % args)
+
+    def do_GET(self):
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        split_path = urllib.parse.urlsplit(self.path)
+
+        match = _TAGS_PATH_REGEXP.match(split_path.path)
+        if match:
+            self._count('tags')
+            query = urllib.parse.parse_qs(split_path.query)
+            page = int(query.get('page', ['1'])[0])
+            return self._send(body=json.dumps(server.tag_page(page=page)).encode('utf-8'), content_type='application/json')
+
+        match = _MANIFEST_PATH_REGEXP.match(split_path.path)
+        if match and match.group('digest') in server.fixture.manifests:
+            self._count('manifests')
+            manifest_digest = match.group('digest')
+            body = json.dumps({'digest': manifest_digest, 'manifest_data': server.fixture.manifests[manifest_digest]})
+            return self._send(body=body.encode('utf-8'), content_type='application/json')
+
+        match = _BLOB_PATH_REGEXP.match(split_path.path)
+        if match and match.group('digest') in server.fixture.blobs:
+            self._count('blobs')
+            self.send_response(307)
+            self.send_header('Location', '/cdn/{}'.format(match.group('digest')))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        match = _CDN_PATH_REGEXP.match(split_path.path)
+        if match and match.group('digest') in server.fixture.blobs:
+            return self._send(body=server.fixture.blobs[match.group('digest')], content_type='application/octet-stream')
+
+        self._count('not found')
+        self._send(body=b'{"error": "not found"}', content_type='application/json', status=404)
+
+    def _count(self, kind):
+        with self.server._lock:
+            self.server.requests[kind] += 1
+
+    def _send(self, body, content_type, status=200):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading early, e.g. after finding release metadata in a layer
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Serve recorded or synthesized Quay registry content for offline show-edges.py runs, e.g. show-edges.py --repository 127.0.0.1:8080/openshift-release-dev/ocp-release CHANNEL.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--fixture',
+        metavar='DIRECTORY',
+        help='Fixture directory to serve.  If it does not exist, it is created by recording or synthesizing.',
+        default='.registry-fixture',
+    )
+    parser.add_argument(
+        '--record',
+        metavar='REPOSITORY',
+        help='Record the fixture from a live repository (e.g. quay.io/openshift-release-dev/ocp-release) instead of synthesizing it.',
+    )
+    parser.add_argument(
+        '--record-pages',
+        dest='record_pages',
+        metavar='COUNT',
+        type=int,
+        help='Number of tag pages to record.',
+        default=1,
+    )
+    parser.add_argument(
+        '--address',
+        metavar='HOST',
+        help='Address to listen on.',
+        default='127.0.0.1',
+    )
+    parser.add_argument(
+        '--port',
+        metavar='PORT',
+        type=int,
+        help='Port to listen on.',
+        default=8080,
+    )
+    parser.add_argument(
+        '--page-size',
+        dest='page_size',
+        metavar='COUNT',
+        type=int,
+        help='Tags per page.',
+        default=50,
+    )
+    parser.add_argument(
+        '--latency',
+        metavar='SECONDS',
+        type=float,
+        help='Delay injected before each response.',
+        default=0,
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s', level=logging.INFO)
+    if os.path.isdir(args.fixture):
+        fixture = Fixture.load(directory=args.fixture)
+    else:
+        if args.record:
+            fixture = record(repository=args.record, pages=args.record_pages)
+        else:
+            fixture = synthesize()
+        fixture.save(directory=args.fixture)
+    server = RegistryStandIn(fixture=fixture, address=(args.address, args.port), page_size=args.page_size, latency=args.latency)
+    _LOGGER.info('serving {} tags from {} on {}'.format(len(fixture.tags), args.fixture, server.host))
+    server.serve_forever()
@@ -2,7 +2,9 @@
 
 import codecs
 import collections
+import concurrent.futures
 import datetime
+import functools
 import http
 import json
 import logging
@@ -10,9 +12,13 @@ import os
 import re
 import socket
 import subprocess
+import sys
+import tempfile
 import textwrap
+import threading
 import time
 import unittest
+import unittest.mock
 import urllib.error
 import urllib.parse
 import urllib.request
@@ -25,6 +31,7 @@ except ModuleNotFoundError as error:
 
 import yaml
 
+import http_cache
 import util
 
 
@@ -34,12 +41,18 @@ _LOGGER.setLevel(logging.DEBUG)
 _ADVISORY_TYPE_REGEXP = re.compile(r'RH[BSE]A')
 _ISO_8601_DELAY_REGEXP = re.compile(r'^P((?P<weeks>\d+)W|((?P<days>\d+)D)?(T(?P<hours>\d+)H)?)$')
 _GIT_BLAME_COMMIT_REGEXP = re.compile(r'^(?P<hash>[0-9a-f]{40}) .*')
-_GIT_BLAME_HEADER_REGEXP = re.compile(r'^(?P<key>[^ \t]+) (?P<value>.*)$')
+_GIT_BLAME_HEADER_REGEXP = re.compile(r'^(?P<key>[^ \t]+)( (?P<value>.*))?$')
 _GIT_BLAME_LINE_REGEXP = re.compile(r'^\t(?P<value>.*)$')
+_GIT_DIFF_VERSION_LINE_REGEXP = re.compile(r'^(?P<change>[+-])- (?P<version>.*)$')
 _GIT_REMOTE_LINE_REGEXP = re.compile(r'^(?P<remote>[^ ]*)\t(?P<uri>(?P<scheme>[^:]*)://(?P<host>[^/]*)/(?P<org>[^/]*)/(?P<repo>[^/.]*)(.git)?) [(](?P<role>.*)[)]$')
 _SEM_VER_REGEXP = re.compile(r'^(?P<major>0|[1-9]\d*)\.(?P<minor>0|[1-9]\d*)\.(?P<patch>0|[1-9]\d*)(?:-(?P<prerelease>(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*)(?:\.(?:0|[1-9]\d*|\d*[a-zA-Z-][0-9a-zA-Z-]*))*))?(?:\+(?P<buildmetadata>[0-9a-zA-Z-]+(?:\.[0-9a-zA-Z-]+)*))?$')
 _REMOTE_CACHE = {}
+_UPDATE_SERVICE = 'https://api.openshift.com/api/upgrades_info/v1/graph'
 _SEMANTIC_VERSION_DELIMITERS = re.compile('[.+-]')
+_PROMOTION_COMMIT_KEYS = {'committer-time', 'summary'}
+_PROMOTION_INDEX_LOCK = threading.Lock()
+_CACHE_LOCKS = collections.defaultdict(threading.Lock)
+_CACHE_LOCKS_LOCK = threading.Lock()
 
 socket.setdefaulttimeout(60)
 
@@ -91,6 +104,94 @@ class TestStabilization(unittest.TestCase):
         for a, b, expected in test_cases:
             assert sem_ver_less_than(a, b) == expected, f'{a} < {b} should be {expected}'
 
+    def test_get_promotions(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(directory)
+
+            def git(*args):
+                return util.git_output(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com'] + list(args)).strip()
+
+            def commit(versions, message):
+                with open('stable-4.16.yaml', 'w') as f:
+                    f.write('name: stable-4.16\nversions:\n' + ''.join('- {}\n'.format(version) for version in versions))
+                git('commit', '--quiet', '--all', '--message', message)
+                return git('rev-parse', 'HEAD')
+
+            git('init', '--quiet', '--initial-branch', 'master')
+            with open('stable-4.16.yaml', 'w') as f:
+                f.write('')
+            git('add', 'stable-4.16.yaml')
+            first = commit(['4.16.0', '4.16.1'], 'Initial versions')
+            self.assertEqual({version: promotion['hash'] for version, promotion in get_promotions('stable-4.16.yaml', index_path='index.json').items()}, {'4.16.0': first, '4.16.1': first})
+
+            git('checkout', '--quiet', '-b', 'promote')
+            commit(['4.16.1', '4.16.2'], 'Promote 4.16.2')
+            git('checkout', '--quiet', 'master')
+            git('merge', '--quiet', '--no-ff', '--message', 'Merge promote', 'promote')
+            merge = git('rev-parse', 'HEAD')
+            last = commit(['4.16.3', '4.16.2', '4.16.1'], 'Promote 4.16.3')
+            promotions = get_promotions('stable-4.16.yaml', index_path='index.json')
+            self.assertEqual(promotions, _promotion_commits(*_blame_promotions(path='stable-4.16.yaml')))
+            self.assertEqual(promotions['4.16.2']['hash'], merge)
+            self.assertEqual(promotions['4.16.3']['summary'], 'Promote 4.16.3')
+            with open('index.json') as f:
+                self.assertEqual(json.load(f)['paths']['stable-4.16.yaml']['commit'], last)
+
+    def test_stabilization_changes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(directory)
+            os.mkdir('channels')
+            os.mkdir('blocked-edges')
+            for name, feeder, versions in [
+                    ('candidate-4.16', None, ['4.16.0', '4.16.1', '4.16.2']),
+                    ('eus-4.16', 'stable-4.16', []),
+                    ('fast-4.16', 'candidate-4.16', ['4.16.0', '4.16.1']),
+                    ('stable-4.16', 'fast-4.16', ['4.16.0']),
+                    ]:
+                data = {'name': name, 'versions': versions}
+                if feeder:
+                    data['feeder'] = {'name': feeder, 'delay': 'P0D'}
+                with open(os.path.join('channels', '{}.yaml'.format(name)), 'w') as f:
+                    yaml.safe_dump(data, f)
+            util.git_output(['git', 'init', '--quiet'])
+            util.git_output(['git', 'add', 'channels'])
+            util.git_output(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '--quiet', '--message', 'Initial versions'])
+
+            module = sys.modules[__name__]
+            lock = threading.Lock()
+            promotions = []
+            active = []
+            messages = []
+
+            def slow_get_promotions(path, get_promotions=get_promotions):
+                time.sleep({'channels/stable-4.16.yaml': 0.2, 'channels/fast-4.16.yaml': 0.1}.get(path, 0))  # later channels finish evaluating first
+                return get_promotions(path, index_path='index.json')
+
+            def fake_promote(version, channel_name, **kwargs):
+                with lock:
+                    active.append(channel_name)
+                    concurrent = len(active)
+                time.sleep(0.05)
+                with lock:
+                    active.remove(channel_name)
+                    promotions.append((channel_name, version, concurrent))
+                return PullRequest(html_url='https://example.com/{}/{}'.format(channel_name, version))
+
+            with unittest.mock.patch.object(module, 'get_promotions', slow_get_promotions), \
+                    unittest.mock.patch.object(module, 'promote', fake_promote), \
+                    unittest.mock.patch.object(module, 'notify', lambda message, webhook=None: messages.append(message)):
+                stabilization_changes(directories={'channels'}, waiting_notifications=False, jobs=4)
+
+        self.assertEqual(promotions, [('eus-4.16', '4.16.0', 1), ('fast-4.16', '4.16.2', 1), ('stable-4.16', '4.16.1', 1)])
+        self.assertEqual(len(messages), 1)
+        self.assertEqual([line.split('.', 1)[0] for line in messages[0].split('\n')], [
+            '* channels/eus-4',
+            '* channels/fast-4',
+            '* channels/stable-4',
+        ])
+
 
 def sem_ver_prerelease_less_than(a, b):
     """Returns true if a is less than b, per https://semver.org/spec/v2.0.0.html#spec-item-11, assuming both are non-empty prerelease segments"""
@@ -167,7 +268,15 @@ def sem_ver_less_than(a, b):
     return sem_ver_prerelease_less_than(a_groups['prerelease'], b_groups['prerelease'])
 
 
-def stabilization_changes(directories, webhook=None, **kwargs):
+def stabilization_changes(directories, webhook=None, jobs=8, **kwargs):
+    """Evaluate feeder promotions for every channel, and notify about the results.
+
+    Channels are evaluated by a pool of jobs threads sharing one cache,
+    so Cincinnati and errata lookups for a cycle take about as long as
+    the slowest channel.  Promotions change the Git checkout, so they
+    are run serially after all of the channels have been evaluated, and
+    notifications keep the sorted channel order.
+    """
     channels, channel_paths = util.load_channels(directories=directories)
 
     update_risks = {}
@@ -175,18 +284,31 @@ def stabilization_changes(directories, webhook=None, **kwargs):
         update_risks[path] = data
 
     cache = {}
+
+    def evaluate(item):
+        name, channel = item
+        return list(stabilize_channel(name=name, channel=channel, channels=channels, channel_paths=channel_paths, update_risks=update_risks, cache=cache, **kwargs))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        evaluations = list(executor.map(evaluate, sorted(channels.items())))
+
     notifications = []
-    for name, channel in sorted(channels.items()):
-        notifications.extend(stabilize_channel(name=name, channel=channel, channels=channels, channel_paths=channel_paths, update_risks=update_risks, cache=cache, **kwargs))
+    for channel_notifications in evaluations:
+        for notification in channel_notifications:
+            if callable(notification):  # a deferred promotion
+                notification = notification()
+            notifications.append(notification)
     if notifications:
         deduped_notifications = []
         for notification in notifications:
             if notification not in deduped_notifications:
                 deduped_notifications.append(notification)
         notify(message='* ' + ('\n* '.join(deduped_notifications)), webhook=webhook)
+    if kwargs.get('http_cache'):
+        _LOGGER.info('Cincinnati HTTP cache: {}'.format(kwargs['http_cache'].format_stats()))
 
 
-def stabilize_channel(name, channel, channels, channel_paths, cache=None, waiting_notifications=True, **kwargs):
+def stabilize_channel(name, channel, channels, channel_paths, cache=None, waiting_notifications=True, update_service=None, http_cache=None, **kwargs):
     if not channel.get('feeder'):
         return
     feeder = channel['feeder']['name']
@@ -229,20 +351,24 @@ def stabilize_channel(name, channel, channels, channel_paths, cache=None, waitin
                 candidates=candidates,
                 cache=cache,
                 waiting_notifications=waiting_notifications,
+                update_service=update_service,
+                http_cache=http_cache,
                 **kwargs)
     if waiting_notifications:
         yield from get_concerns_about_patch_updates(
             channel=channel,
+            update_service=update_service,
+            http_cache=http_cache,
             cache=cache)
 
 
-def stabilize_release(version, channel, channel_path, delay, errata, feeder_name, feeder_promotion, candidates, cache, update_risks=None, waiting_notifications=True, github_token=None, **kwargs):
+def stabilize_release(version, channel, channel_path, delay, errata, feeder_name, feeder_promotion, candidates, cache, update_risks=None, waiting_notifications=True, github_token=None, update_service=None, http_cache=None, **kwargs):
     now = datetime.datetime.now()
     version_delay = now - feeder_promotion['committer-time']
     errata_public = False
     public_errata_message = ''
     if errata:
-        errata_uri, errata_public = public_errata_uri(version=version, channel=feeder_name, cache=cache)
+        errata_uri, errata_public = public_errata_uri(version=version, channel=feeder_name, update_service=update_service, http_cache=http_cache, cache=cache)
         if errata_uri:
             public_errata_message = ' {} is{} public.'.format(errata_uri, '' if errata_public else ' not')
 
@@ -252,7 +378,7 @@ def stabilize_release(version, channel, channel_path, delay, errata, feeder_name
         _LOGGER.error('  failed to promote {} to {}: {}'.format(version, channel['name'], concerns_about_risk_extensions))
         yield 'FAILED {}'.format(concerns_about_risk_extensions)
         return
-    concerns_about_updating_out = get_concerns_about_updating_out(version=version, channel=channel, cache=cache)
+    concerns_about_updating_out = get_concerns_about_updating_out(version=version, channel=channel, update_service=update_service, http_cache=http_cache, cache=cache)
     if concerns_about_updating_out:
         concerns.append(concerns_about_updating_out)
 
@@ -267,20 +393,15 @@ def stabilize_release(version, channel, channel_path, delay, errata, feeder_name
                 version_delay,
                 public_errata_message,
             )
-        try:
-            pull = promote(
-                version=version,
-                channel_name=channel['name'],
-                channel_path=channel_path,
-                subject=subject,
-                body=body,
-                github_token=github_token,
-                **kwargs)
-        except Exception as exc:
-            _LOGGER.error('  failed to promote {} to {}: {}'.format(version, channel['name'], sanitize(exc, github_token=github_token)))
-            yield 'FAILED {}. {} {}'.format(subject, body, sanitize(exc, github_token=github_token))
-        else:
-            yield '{}. {} {}'.format(subject, body, pull.html_url)
+        yield functools.partial(
+            promotion_notification,
+            version=version,
+            channel_name=channel['name'],
+            channel_path=channel_path,
+            subject=subject,
+            body=body,
+            github_token=github_token,
+            **kwargs)
     else:
         if concerns:
             concerns.insert(0, '')  # when joined with the whitespace delimiter, this will add leading space to offset from the rest of the message
@@ -298,7 +419,80 @@ def stabilize_release(version, channel, channel_path, delay, errata, feeder_name
                 '  '.join(concerns))
 
 
-def get_promotions(path):
+def promotion_notification(version, channel_name, subject, body, github_token=None, **kwargs):
+    """Promote version, returning the notification for the promotion or its failure."""
+    try:
+        pull = promote(
+            version=version,
+            channel_name=channel_name,
+            subject=subject,
+            body=body,
+            github_token=github_token,
+            **kwargs)
+    except Exception as exc:
+        _LOGGER.error('  failed to promote {} to {}: {}'.format(version, channel_name, sanitize(exc, github_token=github_token)))
+        return 'FAILED {}. {} {}'.format(subject, body, sanitize(exc, github_token=github_token))
+    return '{}. {} {}'.format(subject, body, pull.html_url)
+
+
+def get_promotions(path, index_path=None):
+    """Return {version: promotion commit} for the '- VERSION' lines of the channel file at path.
+
+    Promotion commits are the first-parent commits which added each
+    line, as attributed by 'git blame --first-parent'.  The attribution
+    is persisted in index_path (default
+    util.default_index_path('promotion-index'), if caching is enabled),
+    keyed by the committed blob of the file.
+    When HEAD has moved along its first-parent history since the file
+    was indexed, the index is updated from the log of the new commits
+    which touched the file, instead of running another full blame.
+    Uncommitted changes to the file fall back to an uncached blame.
+    """
+    if index_path is None:
+        index_path = util.default_index_path('promotion-index')
+    head, blob = util.git_output(['git', 'rev-parse', 'HEAD', 'HEAD:{}'.format(path)]).split()
+    if util.git_output(['git', 'hash-object', path]).strip() != blob:
+        promotions, commits = _blame_promotions(path=path)
+        return _promotion_commits(promotions=promotions, commits=commits)
+
+    with _cache_lock('promotions', path):
+        index = _load_promotion_index(index_path=index_path)
+        entry = index['paths'].get(path)
+        promotions = None
+        commits = {}
+        if entry and entry['commit'] == head:
+            if entry['blob'] == blob:
+                promotions = entry['promotions']
+        elif entry and _first_parent_descendant(head=head, ancestor=entry['commit']):
+            if entry['blob'] == blob:
+                promotions = entry['promotions']
+            else:
+                promotions = _log_promotions(path=path, since=entry['commit'], head=head, promotions=entry['promotions'], commits=commits)
+                if set(promotions) != _listed_versions(path=path):
+                    _LOGGER.warning('incremental promotion index for {} diverged from the file, rebuilding with git blame'.format(path))
+                    promotions = None
+        if promotions is None:
+            promotions, commits = _blame_promotions(path=path)
+
+        entry = {'blob': blob, 'commit': head, 'promotions': promotions}
+        if index_path and index['paths'].get(path) != entry:
+            with _PROMOTION_INDEX_LOCK:  # reload, to keep entries other threads stored for other paths
+                stored = _load_promotion_index(index_path=index_path)
+                stored['paths'][path] = entry
+                stored['commits'].update(commits)
+                util.atomic_write(path=index_path, content=json.dumps(stored, sort_keys=True).encode('utf-8'))
+        commits.update(index['commits'])
+    return _promotion_commits(promotions=promotions, commits=commits)
+
+
+def _cache_lock(*key):
+    """Return the lock for computing the shared cache entry at key, so concurrent channel evaluations compute it once."""
+    with _CACHE_LOCKS_LOCK:
+        return _CACHE_LOCKS[key]
+
+
+def _blame_promotions(path):
+    """Return ({version: commit hash}, {commit hash: commit}) from 'git blame --first-parent' of path."""
     # https://git-scm.com/docs/git-blame#_the_porcelain_format
     process = subprocess.run(['git', 'blame', '--first-parent', '--porcelain', path], check=True, capture_output=True, text=True)
     commits = {}
@@ -308,16 +502,13 @@ def get_promotions(path):
         if match:
             commit = match.group('hash')
             if commit not in commits:
-                commits[commit] = {'hash': commit}
+                commits[commit] = {}
             continue
         match = _GIT_BLAME_HEADER_REGEXP.match(line)
         if match:
             key = match.group('key')
-            value = match.group('value')
-            if key == 'committer-time':
-                commits[commit]['committer-time'] = datetime.datetime.fromtimestamp(int(value))
-            else:
-                commits[commit][key] = value
+            if key in _PROMOTION_COMMIT_KEYS:
+                commits[commit][key] = match.group('value')
             continue
         match = _GIT_BLAME_LINE_REGEXP.match(line)
         if not match:
@@ -327,35 +518,98 @@ def get_promotions(path):
     for line, commit in lines.items():
         if line.startswith('- '):
             version = line[2:]
-            promotions[version] = commits[commit]
+            promotions[version] = commit
+    return promotions, commits
+
+
+def _log_promotions(path, since, head, promotions, commits):
+    """Return promotions updated with the first-parent commits from since to head which touched path, adding the new commits to commits."""
+    process = subprocess.run(
+        ['git', 'log', '--first-parent', '--diff-merges=first-parent', '--reverse', '--patch', '--unified=0', '--no-renames', '--format=%x00%H%x00%ct%x00%s', '{}..{}'.format(since, head), '--', path],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    promotions = dict(promotions)
+    commit = None
+    for line in process.stdout.split('\n'):
+        if line.startswith('\0'):
+            commit, committer_time, summary = line[1:].split('\0', 2)
+            commits[commit] = {'committer-time': committer_time, 'summary': summary}
+            continue
+        match = _GIT_DIFF_VERSION_LINE_REGEXP.match(line)
+        if not match or commit is None:
+            continue
+        if match.group('change') == '-':
+            if promotions.get(match.group('version')) != commit:
+                promotions.pop(match.group('version'), None)
+        else:
+            promotions[match.group('version')] = commit
     return promotions
 
 
+def _listed_versions(path):
+    with open(path) as f:
+        return set(line.rstrip('\n')[2:] for line in f if line.startswith('- '))
+
+
+def _first_parent_descendant(head, ancestor):
+    process = subprocess.run(['git', 'rev-list', '--first-parent', '--parents', '--reverse', '{}..{}'.format(ancestor, head)], capture_output=True, text=True)
+    if process.returncode:
+        return False  # e.g. the indexed commit is no longer available
+    first = process.stdout.split('\n', 1)[0].split()
+    return len(first) > 1 and first[1] == ancestor
+
+
+def _promotion_commits(promotions, commits):
+    promotion_commits = {}
+    for commit in set(promotions.values()):
+        promotion_commits[commit] = dict(commits[commit], hash=commit)
+        promotion_commits[commit]['committer-time'] = datetime.datetime.fromtimestamp(int(commits[commit]['committer-time']))
+    return {version: promotion_commits[commit] for version, commit in promotions.items()}
+
+
+_PROMOTION_INDEX_FORMAT = 1
+
+
+def _load_promotion_index(index_path):
+    index = None
+    try:
+        if index_path:
+            with open(index_path) as f:
+                index = json.load(f)
+    except FileNotFoundError:
+        pass
+    except ValueError as error:
+        _LOGGER.warning('ignoring unreadable promotion index {}: {}'.format(index_path, error))
+        index = None
+    if not isinstance(index, dict) or index.get('format') != _PROMOTION_INDEX_FORMAT:
+        index = {'format': _PROMOTION_INDEX_FORMAT, 'paths': {}, 'commits': {}}
+    return index
+
+
 def public_errata_uri(version, cache=None, **kwargs):
-    if cache and cache.get('versions', {}).get(version, -1) != -1:
-        cached = cache['versions'][version]
-        if not cached:
+    with _cache_lock('versions', version):
+        if cache and cache.get('versions', {}).get(version, -1) != -1:
+            cached = cache['versions'][version]
+            if not cached:
+                return None, None
+            return cached['uri'], cached['public']
+        if kwargs.get('channel') == 'candidate':
+            major_minor = '.'.join(version.split('.', 2)[:2])
+            kwargs['channel'] = 'candidate-{}'.format(major_minor)
+        cincinnati_uri, cincinnati_data = get_cincinnati_channel(cache=cache, **kwargs)
+        canonical_errata_uri = errata_uri_from_cincinnati(version=version, cincinnati_data=cincinnati_data, cincinnati_uri=cincinnati_uri)
+        if not canonical_errata_uri:
+            if cache is not None:
+                cache.setdefault('versions', {})[version] = None
             return None, None
-        return cached['uri'], cached['public']
-    if kwargs.get('channel') == 'candidate':
-        major_minor = '.'.join(version.split('.', 2)[:2])
-        kwargs['channel'] = 'candidate-{}'.format(major_minor)
-    cincinnati_uri, cincinnati_data = get_cincinnati_channel(cache=cache, **kwargs)
-    canonical_errata_uri = errata_uri_from_cincinnati(version=version, cincinnati_data=cincinnati_data, cincinnati_uri=cincinnati_uri)
-    if not canonical_errata_uri:
+        errata_uri, public = _public_errata_uri(uri=canonical_errata_uri)
         if cache is not None:
-            if 'versions' not in cache:
-                cache['versions'] = {}
-            cache['versions'][version] = None
-        return None, None
-    errata_uri, public = _public_errata_uri(uri=canonical_errata_uri)
-    if cache is not None:
-        if 'versions' not in cache:
-            cache['versions'] = {}
-        cache['versions'][version] = {
-            'uri': errata_uri,
-            'public': public,
-        }
+            cache.setdefault('versions', {})[version] = {
+                'uri': errata_uri,
+                'public': public,
+            }
     return errata_uri, public
 
 
@@ -412,7 +666,7 @@ def get_concerns_about_risk_extensions(version, channel, candidates, update_risk
     return
 
 
-def get_concerns_about_updating_out(version, channel, cache=None):
+def get_concerns_about_updating_out(version, channel, update_service=None, http_cache=None, cache=None):
     release_major_minor = '.'.join(version.split('.', 2)[:2])
     try:
         phase, channel_major_minor = channel['name'].rsplit('-', 1)
@@ -433,7 +687,7 @@ def get_concerns_about_updating_out(version, channel, cache=None):
         raise ValueError('unclear which candidate channels to pull for update information between {} and {}'.format(release_major_minor, channel_major_minor))
     candidate_minor = channel_minor
     while candidate_minor > release_minor:
-        cincinnati_uri, cincinnati_data = get_cincinnati_channel(cache=cache, channel='candidate-{}.{}'.format(channel_major, candidate_minor))
+        cincinnati_uri, cincinnati_data = get_cincinnati_channel(channel='candidate-{}.{}'.format(channel_major, candidate_minor), update_service=update_service, http_cache=http_cache, cache=cache)
         nodes = cincinnati_data.get('nodes', [])
         for edge in cincinnati_data.get('edges', []):
             source = nodes[edge[0]]['version']
@@ -466,7 +720,7 @@ def get_concerns_about_updating_out(version, channel, cache=None):
     return 'No paths from {} to {} in {}'.format(version, channel_major_minor, ' '.join(cincinnati_uris))
 
 
-def get_concerns_about_patch_updates(channel, cache=None):
+def get_concerns_about_patch_updates(channel, update_service=None, http_cache=None, cache=None):
     if len(channel['versions']) > 1:
         patch_updates = collections.defaultdict(lambda: collections.defaultdict(set))
         largest_version = list(sorted(channel['versions'], key=semver_sort_key))[-1]
@@ -475,7 +729,7 @@ def get_concerns_about_patch_updates(channel, cache=None):
         early_channel = 'candidate-{}.{}'.format(release_major, release_minor)
         if major_minor_prefix == '4.1.':
             early_channel = 'prerelease-{}.{}'.format(release_major, release_minor)
-        cincinnati_uri, cincinnati_data = get_cincinnati_channel(cache=cache, channel=early_channel)
+        cincinnati_uri, cincinnati_data = get_cincinnati_channel(channel=early_channel, update_service=update_service, http_cache=http_cache, cache=cache)
         nodes = cincinnati_data.get('nodes', [])
         for edge in cincinnati_data.get('edges', []):
             source = nodes[edge[0]]['version']
@@ -528,7 +782,16 @@ def get_concerns_about_patch_updates(channel, cache=None):
                 yield warning
 
 
-def get_cincinnati_channel(arch='amd64', channel='', update_service='https://api.openshift.com/api/upgrades_info/v1/graph', cache=None):
+def get_cincinnati_channel(arch='amd64', channel='', update_service=None, http_cache=None, cache=None):
+    """Return (uri, data) for the Cincinnati graph of the channel and arch.
+
+    The graph is fetched from update_service directly, unless an
+    http_cache.HTTPCache is given, in which case responses younger than
+    its TTL are reused without a request.
+    """
+    if not update_service:
+        update_service = _UPDATE_SERVICE
+
     params = {
         'channel': channel,
         'arch': arch,
@@ -540,26 +803,25 @@ def get_cincinnati_channel(arch='amd64', channel='', update_service='https://api
 
     uri = '{}?{}'.format(update_service, urllib.parse.urlencode(params))
 
-    if cache and cache.get('channels', {}).get(channel, {}).get(arch):
-        return uri, cache['channels'][channel][arch]
+    with _cache_lock('channels', channel, arch):
+        if cache and cache.get('channels', {}).get(channel, {}).get(arch):
+            return uri, cache['channels'][channel][arch]
 
-    request = urllib.request.Request(uri, headers=headers)
-    _LOGGER.debug('retrieve Cincinnati data from {}'.format(uri))
-    while True:
-        try:
-            with urllib.request.urlopen(request) as f:
-                data = json.load(codecs.getreader('utf-8')(f))  # hack: should actually respect Content-Type
-        except Exception as exc:
-            _LOGGER.error('{}: {}'.format(uri, exc))
-            time.sleep(10)
-            continue
-        break
-    if cache is not None:
-        if 'channels' not in cache:
-            cache['channels'] = {}
-        if channel not in cache['channels']:
-            cache['channels'][channel] = {}
-        cache['channels'][channel][arch] = data
+        _LOGGER.debug('retrieve Cincinnati data from {}'.format(uri))
+        while True:
+            try:
+                if http_cache:
+                    data = http_cache.get_json(uri=uri, headers=headers)  # hack: should actually respect Content-Type
+                else:
+                    with urllib.request.urlopen(urllib.request.Request(uri, headers=headers)) as f:
+                        data = json.load(codecs.getreader('utf-8')(f))  # hack: should actually respect Content-Type
+            except Exception as exc:
+                _LOGGER.error('{}: {}'.format(uri, exc))
+                time.sleep(10)
+                continue
+            break
+        if cache is not None:
+            cache.setdefault('channels', {}).setdefault(channel, {})[arch] = data
     return uri, data
 
 
@@ -763,6 +1025,26 @@ def main():
         help='Set this to actually push notifications to Slack.  Defaults to the value of the WEBHOOK environment variable.',
         default=os.environ.get('WEBHOOK', ''),
     )
+    parser.add_argument(
+        '--update-service',
+        dest='update_service',
+        metavar='URI',
+        help='Cincinnati graph endpoint for channel data, e.g. a local cincinnati_stand_in.py.',
+        default=_UPDATE_SERVICE,
+    )
+    parser.add_argument(
+        '--jobs',
+        metavar='COUNT',
+        type=int,
+        help='Number of channels to evaluate concurrently.',
+        default=8,
+    )
+    parser.add_argument(
+        '--http-cache',
+        dest='http_cache',
+        action='store_true',
+        help='Reuse Cincinnati graph responses from the on-disk HTTP cache while they are fresh, instead of fetching them for every round.',
+    )
 
     args = parser.parse_args()
 
@@ -789,6 +1071,9 @@ def main():
             webhook=args.webhook.strip(),
             waiting_notifications=waiting_notifications,
             upstream_branch=upstream_branch,
+            update_service=args.update_service,
+            jobs=args.jobs,
+            http_cache=http_cache.DEFAULT_HTTP_CACHE if args.http_cache else None,
         )
         if args.poll:
             _LOGGER.info('sleeping {} seconds before reconsidering promotions'.format(args.poll))
@@ -1,61 +1,486 @@
 # Assorted utilities for processing graph-data.
 
+import collections
+import concurrent.futures
+import datetime
+import hashlib
 import io
+import json
+import logging
 import os
 import subprocess
+import tempfile
+import threading
+import time
+import unittest
 
 import yaml
 
 
-def walk_yaml(directory, revision=None, allowed_extensions=None):
-    if revision is None:
-        for root, _, files in os.walk(directory):
-            for filename in files:
-                if not filename.endswith('.yaml'):
-                    if allowed_extensions:
-                        _, ext = os.path.splitext(filename)
-                        if ext not in allowed_extensions:
+_LOGGER = logging.getLogger(__name__)
+
+
+class YAMLCache(object):
+    """Persistent cache of parsed YAML documents.
+
+    Entries are keyed by Git blob name when loading from a revision, or by
+    path, modification time, and size when loading from the working tree.
+    Parsed data is stored as JSON, so documents which do not survive a
+    JSON round trip (e.g. with dates or non-string keys) are not cached,
+    and the least-recently used entries are evicted when the cache grows
+    beyond max_bytes.  The cache may be shared between threads.
+    """
+    _FORMAT = 2
+    _TOUCH_INTERVAL = 60 * 60  # seconds; avoid rewriting the cache just to refresh access times
+
+    def __init__(self, path=None, max_bytes=64 * 1024 * 1024):
+        if path is None:
+            path = os.path.join(cache_directory(), 'yaml-cache.json')
+        self.path = path
+        self.max_bytes = max_bytes
+        self._entries = None
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return
+        self._entries = {}
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as error:
+            _LOGGER.warning('ignoring unreadable YAML cache {}: {}'.format(self.path, error))
+            return
+        if isinstance(cached, dict) and cached.get('format') == self._FORMAT and isinstance(cached.get('entries'), dict):
+            self._entries = {key: entry for key, entry in cached['entries'].items() if isinstance(entry, list) and len(entry) == 2 and isinstance(entry[1], str)}
+
+    def get(self, key):
+        with self._lock:
+            self._load()
+            entry = self._entries[key]
+            now = time.time()
+            if now - entry[0] > self._TOUCH_INTERVAL:
+                entry[0] = now
+                self._dirty = True
+            encoded = entry[1]
+        return json.loads(encoded)
+
+    def set(self, key, data):
+        try:
+            encoded = json.dumps(data, sort_keys=True)
+        except (TypeError, ValueError):
+            return
+        if json.loads(encoded) != data:
+            return
+        with self._lock:
+            self._load()
+            self._entries[key] = [time.time(), encoded]
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            size = 0
+            for key, entry in sorted(self._entries.items(), key=lambda item: -item[1][0]):
+                size += len(key) + len(entry[1])
+                if size > self.max_bytes:
+                    del self._entries[key]
+            atomic_write(path=self.path, content=json.dumps({'format': self._FORMAT, 'entries': self._entries}).encode('utf-8'))
+            self._dirty = False
+
+
+def cache_directory():
+    """Return the directory for persistent caches, under $XDG_CACHE_HOME (default ~/.cache)."""
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'cincinnati-graph-data')
+
+
+def cache_enabled():
+    """Return whether persistent caches in cache_directory() are enabled.
+
+    GRAPH_DATA_CACHE=1 enables them and GRAPH_DATA_CACHE=0 disables them.
+    When it is unset, they are enabled except in CI (when the CI
+    environment variable is set).
+    """
+    setting = os.environ.get('GRAPH_DATA_CACHE')
+    if setting is None:
+        return not os.environ.get('CI')
+    return setting not in ('', '0', 'false')
+
+
+def default_index_path(name):
+    """Return the path for the named derived index in cache_directory(), or None if persistent caches are disabled (see cache_enabled).
+
+    Indexes are kept per working directory, so separate checkouts do not
+    replace each other's.
+    """
+    if not cache_enabled():
+        return None
+    checkout = hashlib.sha256(os.path.abspath(os.curdir).encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_directory(), 'indexes', checkout, '{}.json'.format(name))
+
+
+def _default_yaml_cache():
+    """Return the default YAMLCache, or None if caching is disabled (see cache_enabled)."""
+    if not cache_enabled():
+        return None
+    return YAMLCache()
+
+
+def atomic_write(path, content):
+    """Replace the file at path with content (bytes), so concurrent readers see either the old or the new file."""
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, prefix='.tmp-', delete=False) as f:
+        try:
+            f.write(content)
+        except:
+            os.remove(f.name)
+            raise
+    os.replace(f.name, path)
+
+
+DEFAULT_YAML_CACHE = _default_yaml_cache()
+
+# libyaml-backed loader, when PyYAML was built with it.
+FAST_SAFE_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+FAST_SAFE_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+
+def _parse_yaml(path, text, loader=yaml.SafeLoader, stream_name=None):
+    stream = io.StringIO(text)
+    if stream_name:
+        stream.name = stream_name  # used in YAML error marks
+    try:
+        return yaml.load(stream, Loader=loader)
+    except ValueError as error:
+        raise ValueError('failed to load YAML from {}: {}'.format(path, error))
+
+
+def _parse_yaml_item(item):
+    return _parse_yaml(*item)
+
+
+def _load_yaml(path, read, key, cache, loader=yaml.SafeLoader, stream_name=None):
+    if cache is not None:
+        try:
+            return cache.get(key)
+        except KeyError:
+            pass
+    data = _parse_yaml(path=path, text=read(), loader=loader, stream_name=stream_name)
+    if cache is not None:
+        cache.set(key, data)
+    return data
+
+
+def _read_text(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return 'stat:{}:{}:{}'.format(os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+
+def yaml_paths(directory, allowed_extensions=None, invalid=None):
+    """Yield the path of each YAML file under directory in the working tree.
+
+    Other files are skipped, unless allowed_extensions is set and does
+    not include their extension.  Those raise ValueError, or, when invalid
+    is a list, are appended to it.
+    """
+    for root, _, files in os.walk(directory):
+        for filename in files:
+            if not filename.endswith('.yaml'):
+                if allowed_extensions:
+                    _, ext = os.path.splitext(filename)
+                    if ext not in allowed_extensions:
+                        if invalid is None:
                             raise ValueError('invalid filename: {!r} (allowed extensions: {})'.format(os.path.join(root, filename), allowed_extensions))
-                    continue
-                path = os.path.join(root, filename)
-                with open(path) as f:
-                    try:
-                        data = yaml.load(f, Loader=yaml.SafeLoader)
-                    except ValueError as error:
-                        raise ValueError('failed to load YAML from {}: {}'.format(path, error))
-                yield (path, data)
+                        invalid.append(os.path.join(root, filename))
+                continue
+            yield os.path.join(root, filename)
+
+
+def _yaml_sources(directory, revision=None, allowed_extensions=None, reader=None):
+    """Yield (path, cache-key, read, stream-name) for each YAML file, where read() returns the file's text."""
+    if revision is None:
+        for path in yaml_paths(directory=directory, allowed_extensions=allowed_extensions):
+            yield (path, _stat_key(path), lambda path=path: _read_text(path), path)
+        return
+
+    if reader is None:
+        with GitObjectReader() as reader:
+            yield from _yaml_sources(directory=directory, revision=revision, reader=reader)
         return
 
-    list_process = subprocess.run(
-        ['git', 'ls-tree', '-r', '--name-only', revision, directory],
+    for path, object_name in ls_tree(directory=directory, revision=revision):
+        if not path.endswith('.yaml'):
+            continue
+        yield (path, 'blob:{}'.format(object_name), lambda object_name=object_name: reader.read(object_name=object_name).decode('utf-8'), None)
+
+
+def _load_yaml_pool(sources, cache, loader, processes):
+    entries = []
+    misses = []
+    for path, key, read, stream_name in sources:
+        if cache is not None:
+            try:
+                entries.append((path, key, True, cache.get(key)))
+                continue
+            except KeyError:
+                pass
+        entries.append((path, key, False, None))
+        misses.append((path, read(), loader, stream_name))
+
+    parsed = iter(())
+    executor = None
+    if misses:
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=processes)
+        chunksize = max(1, len(misses) // (4 * (processes or os.cpu_count() or 1)))
+        parsed = executor.map(_parse_yaml_item, misses, chunksize=chunksize)
+    try:
+        for path, key, hit, data in entries:
+            if not hit:
+                data = next(parsed)
+                if cache is not None:
+                    cache.set(key, data)
+            yield (path, data)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+
+def walk_yaml(directory, revision=None, allowed_extensions=None, cache=DEFAULT_YAML_CACHE, loader=yaml.SafeLoader, processes=None):
+    """Yield (path, data) for each YAML file under directory.
+
+    Set loader to FAST_SAFE_LOADER to parse with libyaml when it is
+    available.  Set processes to parse cache misses in a pool of that many
+    worker processes (0 for one per CPU); results are still yielded in
+    directory order, and errors are raised at the failing file, as in
+    serial mode.
+    """
+    sources = _yaml_sources(directory=directory, revision=revision, allowed_extensions=allowed_extensions)
+    if processes is None:
+        for path, key, read, stream_name in sources:
+            yield (path, _load_yaml(path=path, read=read, key=key, cache=cache, loader=loader, stream_name=stream_name))
+    else:
+        yield from _load_yaml_pool(sources=sources, cache=cache, loader=loader, processes=processes or None)
+    if cache is not None:
+        cache.save()
+
+
+def load_yaml_files(paths, revision=None, cache=DEFAULT_YAML_CACHE, loader=yaml.SafeLoader):
+    """Yield (path, data) for each of the given YAML files, in order.
+
+    Paths missing from the working tree (or from revision) are skipped.
+    """
+    if revision is None:
+        for path in paths:
+            try:
+                key = _stat_key(path)
+            except FileNotFoundError:
+                continue
+            yield (path, _load_yaml(path=path, read=lambda: _read_text(path), key=key, cache=cache, loader=loader, stream_name=path))
+    elif paths:
+        object_names = dict(ls_tree(directory=paths, revision=revision))
+        with GitObjectReader() as reader:
+            for path in paths:
+                if path not in object_names:
+                    continue
+                object_name = object_names[path]
+                yield (path, _load_yaml(path=path, read=lambda: reader.read(object_name=object_name).decode('utf-8'), key='blob:{}'.format(object_name), cache=cache, loader=loader))
+    if cache is not None:
+        cache.save()
+
+
+def git_output(args):
+    """Run a Git command, returning its standard output as text."""
+    return subprocess.run(args, capture_output=True, check=True, text=True).stdout
+
+
+def ls_tree(directory, revision):
+    """Yield (path, blob-object-name) for each blob under directory (a path or list of paths) at revision."""
+    if isinstance(directory, str):
+        directory = [directory]
+    process = subprocess.run(
+        ['git', 'ls-tree', '-r', '-z', revision, '--'] + list(directory),
         capture_output=True,
         check=True,
-        text=True,
     )
-    for path in list_process.stdout.splitlines():
-        if not path.endswith('.yaml'):
+    for entry in process.stdout.split(b'\0'):
+        if not entry:
             continue
-        process = subprocess.run(
-            ['git', 'cat-file', '-p', '{}:{}'.format(revision, path)],
-            capture_output=True,
-            check=True,
-            text=True,
-        )
-        try:
-            data = yaml.load(io.StringIO(process.stdout), Loader=yaml.SafeLoader)
-        except ValueError as error:
-            raise ValueError('failed to load YAML from {}: {}'.format(path, error))
-        yield (path, data)
+        info, path = entry.split(b'\t', 1)
+        _, object_type, object_name = info.split(b' ')
+        if object_type != b'blob':
+            continue
+        yield (path.decode('utf-8'), object_name.decode('ascii'))
+
+
+class GitObjectReader(object):
+    """Read Git objects through a single long-lived 'git cat-file --batch' process."""
+    def __init__(self):
+        self._process = None
+
+    def __enter__(self):
+        return self
 
+    def __exit__(self, *args):
+        self.close()
 
-def load_channels(revision=None, directories=('channels', 'internal-channels')):
+    def read(self, object_name):
+        if self._process is None:
+            self._process = subprocess.Popen(
+                ['git', 'cat-file', '--batch'],
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+            )
+        self._process.stdin.write(object_name.encode('ascii') + b'\n')
+        self._process.stdin.flush()
+        header = self._process.stdout.readline()
+        if not header:
+            raise ValueError('git cat-file exited unexpectedly while reading {}'.format(object_name))
+        fields = header.split()
+        if len(fields) != 3:
+            raise ValueError('unable to read Git object {}: {}'.format(object_name, header.decode('utf-8', 'replace').strip()))
+        size = int(fields[2])
+        content = self._process.stdout.read(size)
+        self._process.stdout.read(1)  # trailing newline
+        return content
+
+    def close(self):
+        if self._process is None:
+            return
+        self._process.stdin.close()
+        self._process.stdout.close()
+        self._process.wait()
+        self._process = None
+
+
+def load_channels(revision=None, directories=('channels', 'internal-channels'), cache=DEFAULT_YAML_CACHE):
     channels = {}
     paths = {}
     for directory in directories:
-        for path, data in walk_yaml(directory=directory, revision=revision):
+        for path, data in walk_yaml(directory=directory, revision=revision, cache=cache):
             channel = data['name']
             if channel in channels:
                 raise ValueError('multiple definitions for {}: {} and {}'.format(channel, paths[channel], path))
             paths[channel] = path
             channels[channel] = data
     return channels, paths
+
+
+RISK_EDGE_PROPERTIES = {'from', 'to', 'fixedIn'}
+
+
+def risk_fingerprint(data):
+    """Hash the blocked-edge properties which must match for all edges declaring the same risk name.
+
+    The properties are hashed as YAML, so values which only match as
+    strings (e.g. a date and its ISO 8601 text) get different fingerprints.
+    """
+    shared = {key: value for key, value in data.items() if key not in RISK_EDGE_PROPERTIES}
+    return hashlib.sha256(yaml.dump(shared, Dumper=FAST_SAFE_DUMPER, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def group_risks(directory='blocked-edges', revision=None, cache=DEFAULT_YAML_CACHE):
+    """Return {name: [(path, data), ...]} for the named risks in directory, with names and paths sorted."""
+    risks = collections.defaultdict(list)
+    for path, data in walk_yaml(directory=directory, revision=revision, cache=cache):
+        if 'name' in data:
+            risks[data['name']].append((path, data))
+    return {name: sorted(entries, key=lambda entry: entry[0]) for name, entries in sorted(risks.items())}
+
+
+def load_channel(name, revision=None, directories=('channels', 'internal-channels'), index_path=None, cache=DEFAULT_YAML_CACHE):
+    """Load a single channel, parsing only the file that declares it.
+
+    Channel names are resolved through an index from file cache keys (see
+    walk_yaml) to channel names, persisted at index_path (default
+    default_index_path('channel-index'), if caching is enabled).  Only
+    files whose key is not in the index are parsed to refresh it, and
+    duplicate channel names are still detected across all of the
+    directories.
+    """
+    if index_path is None:
+        index_path = default_index_path('channel-index')
+    with GitObjectReader() as reader:
+        names = _load_channel_index(path=index_path) if index_path else {}
+        current_names = {}
+        sources = {}
+        for directory in directories:
+            for path, key, read, stream_name in _yaml_sources(directory=directory, revision=revision, reader=reader):
+                channel = names.get(key)
+                if channel is None:
+                    channel = _load_yaml(path=path, read=read, key=key, cache=cache, stream_name=stream_name)['name']
+                current_names[key] = channel
+                if channel in sources:
+                    raise ValueError('multiple definitions for {}: {} and {}'.format(channel, sources[channel][0], path))
+                sources[channel] = (path, key, read, stream_name)
+        if index_path and current_names != names:
+            atomic_write(path=index_path, content=json.dumps({'format': _CHANNEL_INDEX_FORMAT, 'names': current_names}, sort_keys=True).encode('utf-8'))
+
+        if name not in sources:
+            raise ValueError('no channel named {}'.format(name))
+        path, key, read, stream_name = sources[name]
+        data = _load_yaml(path=path, read=read, key=key, cache=cache, stream_name=stream_name)
+    if cache is not None:
+        cache.save()
+    return data, path
+
+
+_CHANNEL_INDEX_FORMAT = 1
+
+
+def _load_channel_index(path):
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except ValueError as error:
+        _LOGGER.warning('ignoring unreadable channel index {}: {}'.format(path, error))
+        return {}
+    if not isinstance(index, dict) or index.get('format') != _CHANNEL_INDEX_FORMAT:
+        return {}
+    return index['names']
+
+
+class TestYAMLCache(unittest.TestCase):
+    def test_invalidation(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'channels', 'stable-4.16.yaml')
+            os.makedirs(os.path.dirname(path))
+            with open(path, 'w') as f:
+                f.write('name: stable-4.16\nversions:\n- 4.16.0\n')
+            cache = YAMLCache(path=os.path.join(directory, 'cache', 'yaml-cache.json'))
+            self.assertEqual(list(walk_yaml(directory=os.path.dirname(path), cache=cache)), [(path, {'name': 'stable-4.16', 'versions': ['4.16.0']})])
+            self.assertEqual(YAMLCache(path=cache.path).get(_stat_key(path)), {'name': 'stable-4.16', 'versions': ['4.16.0']})
+
+            with open(path, 'w') as f:
+                f.write('name: stable-4.16\nversions:\n- 4.16.0\n- 4.16.1\n')
+            cache = YAMLCache(path=cache.path)
+            self.assertEqual(list(walk_yaml(directory=os.path.dirname(path), cache=cache)), [(path, {'name': 'stable-4.16', 'versions': ['4.16.0', '4.16.1']})])
+
+            cache.set('dated', {'fixedIn': datetime.date(2024, 1, 1)})
+            cache.set('integer-keys', {1: 'a'})
+            for key in ['dated', 'integer-keys']:
+                with self.assertRaises(KeyError):
+                    cache.get(key)
+
+    def test_eviction(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = YAMLCache(path=os.path.join(directory, 'yaml-cache.json'), max_bytes=len('old') + len('["a"]'))
+            cache.set('old', ['a'])
+            cache.set('new', ['b'])
+            cache._entries['old'][0] -= 10
+            cache.save()
+            cache = YAMLCache(path=cache.path)
+            self.assertEqual(cache.get('new'), ['b'])
+            with self.assertRaises(KeyError):
+                cache.get('old')
@@ -1,18 +1,41 @@
 #!/usr/bin/env python3
 
+import collections
+import concurrent.futures
+import datetime
 import difflib
+import json
+import logging
 import os
 import re
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import promql
 import util
 
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
 import yaml
 
 
 # Risk names must be CamelCase to be assignable to condition.Reason
 # https://github.com/openshift/api/blob/8891815aa476232109dccf6c11b8611d209445d9/vendor/k8s.io/apimachinery/pkg/apis/meta/v1/types.go#L1519-L1520C3
 # Note that our regex is stricter, we should never need names more complicated than this.
+_LOGGER = logging.getLogger(__name__)
+
 NAME_RE = re.compile(r'^[A-Z][A-Za-z0-9_]*$')
 
+_VERSION_PREFIX_RE = re.compile(r'^(\d+)\.(\d+)\.(\d+)')
+
+# Architectures appended to release versions when matching 'from' patterns, as in show-edges.py's get_blocked.
+ARCHITECTURES = ('amd64', 'arm64', 'multi', 'ppc64le', 's390x')
+
 
 def validate_blocked_edges(directory):
     risks = {}
@@ -21,29 +44,348 @@ def validate_blocked_edges(directory):
             validate_blocked_edge(data=data, path=path)
             if 'name' in data:
                 name = data['name']
+                fingerprint = util.risk_fingerprint(data)
                 if name in risks:
-                    # The CVO has API requiring that 'url', 'message', and 'matchingRules' match for all risks with the same 'name'.
-                    # A diverging 'matchingRules' value may not lead to CVO's trouble, but we do not have such a case yet.
-                    keys = set(data.keys())
-                    keys.update(risks[name]['data'].keys())
-                    for key in sorted(keys):
-                        if key in {'from', 'to', 'fixedIn'}:
-                            continue
-                        a = yaml.dump(data.get(key))
-                        b = yaml.dump(risks[name]['data'].get(key))
-                        if a != b:
-                            raise ValueError('risk {} diverges on {}:\n{}'.format(name, key, '\n'.join(difflib.unified_diff(a.split('\n'), b.split('\n'), fromfile=path, tofile=risks[name]['path'], lineterm=''))))
+                    if fingerprint != risks[name]['fingerprint']:
+                        check_risk_divergence(name=name, path=path, data=data, other_path=risks[name]['path'], other_data=risks[name]['data'])
                 else:
-                    risks[name] = {'path': path, 'data': data}
+                    risks[name] = {'path': path, 'data': data, 'fingerprint': fingerprint}
         except Exception as error:
             raise ValueError('invalid blocked edge {}: {}'.format(path, error)) from None
 
 
+def check_risk_divergence(name, path, data, other_path, other_data):
+    # The CVO has API requiring that 'url', 'message', and 'matchingRules' match for all risks with the same 'name'.
+    # A diverging 'matchingRules' value may not lead to CVO's trouble, but we do not have such a case yet.
+    keys = set(data.keys())
+    keys.update(other_data.keys())
+    for key in sorted(keys):
+        if key in util.RISK_EDGE_PROPERTIES:
+            continue
+        a = yaml.dump(data.get(key))
+        b = yaml.dump(other_data.get(key))
+        if a != b:
+            raise ValueError('risk {} diverges on {}:\n{}'.format(name, key, '\n'.join(difflib.unified_diff(a.split('\n'), b.split('\n'), fromfile=path, tofile=other_path, lineterm=''))))
+
+
+def collect_blocked_edge_errors(directory, jobs=None):
+    """Validate every blocked edge in directory, returning all errors instead of stopping at the first.
+
+    Files are parsed and validated in a pool of jobs worker processes (one
+    per CPU when jobs is None), and risk-name divergence is checked after
+    the workers finish.  Errors are returned as a list of {'path': ...,
+    'error': ...} dicts sorted by path.
+    """
+    invalid = []
+    paths = sorted(util.yaml_paths(directory=directory, allowed_extensions=('.yaml',), invalid=invalid))
+    errors = [{'path': path, 'error': 'invalid filename (allowed extensions: .yaml)'} for path in invalid]
+
+    if jobs == 1:
+        results = list(map(_validate_blocked_edge_file, paths))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+            chunksize = max(1, len(paths) // (4 * (jobs or os.cpu_count() or 1)))
+            results = list(executor.map(_validate_blocked_edge_file, paths, chunksize=chunksize))
+
+    risks = collections.defaultdict(list)
+    for path, error, name, fingerprint in results:
+        if error:
+            errors.append({'path': path, 'error': error})
+        elif name:
+            risks[name].append((path, fingerprint))
+
+    for name, entries in sorted(risks.items()):
+        reference_path, reference_fingerprint = entries[0]
+        reference_data = None
+        for path, fingerprint in entries[1:]:
+            if fingerprint == reference_fingerprint:
+                continue
+            if reference_data is None:
+                _, reference_data = next(util.load_yaml_files(paths=[reference_path]))
+            _, data = next(util.load_yaml_files(paths=[path]))
+            try:
+                check_risk_divergence(name=name, path=path, data=data, other_path=reference_path, other_data=reference_data)
+            except ValueError as error:
+                errors.append({'path': path, 'error': str(error)})
+
+    return sorted(errors, key=lambda error: (error['path'], error['error']))
+
+
+def _validate_blocked_edge_file(path):
+    try:
+        _, data = next(util.load_yaml_files(paths=[path], cache=None, loader=util.FAST_SAFE_LOADER))  # no shared cache across worker processes
+        validate_blocked_edge(data=data, path=path)
+    except Exception as error:
+        return path, str(error), None, None
+    name = data.get('name')
+    if name is None:
+        return path, None, None, None
+    return path, None, name, util.risk_fingerprint(data)
+
+
+def validate_blocked_edges_since(directory, since, index_path=None):
+    """Validate only the blocked edges which changed since the given revision.
+
+    Risk-name divergence is checked against a per-name index of
+    risk_fingerprint values for the files at that revision, which is
+    persisted in index_path (see load_risk_index) and updated
+    incrementally as the base revision moves.
+    """
+    base = util.git_output(['git', 'rev-parse', '--verify', '{}^{{commit}}'.format(since)]).strip()
+    index = load_risk_index(directory=directory, revision=base, index_path=index_path)
+
+    changed = set(util.git_output(['git', 'diff', '--name-only', '--no-renames', '-z', base, '--', directory]).split('\0'))
+    changed.update(util.git_output(['git', 'ls-files', '--others', '--exclude-standard', '-z', '--', directory]).split('\0'))
+    changed.discard('')
+    for path in sorted(changed):
+        _, ext = os.path.splitext(path)
+        if ext != '.yaml' and os.path.exists(path):
+            raise ValueError('invalid filename: {!r} (allowed extensions: {})'.format(path, ('.yaml',)))
+
+    changed_risks = collections.defaultdict(dict)
+    for path, data in util.load_yaml_files(paths=sorted(changed)):
+        try:
+            validate_blocked_edge(data=data, path=path)
+        except Exception as error:
+            raise ValueError('invalid blocked edge {}: {}'.format(path, error)) from None
+        if 'name' in data:
+            changed_risks[data['name']][path] = data
+
+    for name, changed_paths in sorted(changed_risks.items()):
+        unchanged = sorted((path, fingerprint) for path, fingerprint in index.get(name, {}).items() if path not in changed)
+        if unchanged:
+            reference_path, reference_fingerprint = unchanged[0]
+            reference_data = None
+        else:
+            reference_path = sorted(changed_paths)[0]
+            reference_data = changed_paths[reference_path]
+            reference_fingerprint = util.risk_fingerprint(reference_data)
+        for path, data in sorted(changed_paths.items()):
+            if path == reference_path or util.risk_fingerprint(data) == reference_fingerprint:
+                continue
+            if reference_data is None:
+                _, reference_data = next(util.load_yaml_files(paths=[reference_path], revision=base))
+            try:
+                check_risk_divergence(name=name, path=path, data=data, other_path=reference_path, other_data=reference_data)
+            except Exception as error:
+                raise ValueError('invalid blocked edge {}: {}'.format(path, error)) from None
+
+
+_RISK_INDEX_FORMAT = 2
+
+
+def load_risk_index(directory, revision, index_path=None):
+    """Return {name: {path: fingerprint}} for the risks declared in directory at revision.
+
+    The index is persisted at index_path (default
+    util.default_index_path('risk-index'), if caching is enabled).
+    """
+    if index_path is None:
+        index_path = util.default_index_path('risk-index')
+    stored = None
+    if index_path:
+        try:
+            with open(index_path) as f:
+                stored = json.load(f)
+            if stored.get('format') != _RISK_INDEX_FORMAT or stored.get('directory') != directory:
+                stored = None
+        except (IOError, ValueError):
+            stored = None
+
+    if stored and stored['revision'] == revision:
+        return stored['risks']
+
+    paths = None
+    if stored:
+        try:
+            paths = util.git_output(['git', 'diff', '--name-only', '--no-renames', '-z', stored['revision'], revision, '--', directory]).split('\0')
+        except subprocess.CalledProcessError:
+            paths = None  # e.g. the previously-indexed revision is no longer available
+
+    if paths is None:
+        risks = {}
+        for name, entries in util.group_risks(directory=directory, revision=revision).items():
+            risks[name] = {path: util.risk_fingerprint(data) for path, data in entries}
+    else:
+        paths = set(path for path in paths if path)
+        risks = collections.defaultdict(dict)
+        for name, fingerprints in stored['risks'].items():
+            for path, fingerprint in fingerprints.items():
+                if path not in paths:
+                    risks[name][path] = fingerprint
+        for path, data in util.load_yaml_files(paths=sorted(path for path in paths if path.endswith('.yaml')), revision=revision):
+            if 'name' in data:
+                risks[data['name']][path] = util.risk_fingerprint(data)
+
+    risks = dict(risks)
+    if index_path:
+        util.atomic_write(path=index_path, content=json.dumps({'format': _RISK_INDEX_FORMAT, 'directory': directory, 'revision': revision, 'risks': risks}, sort_keys=True).encode('utf-8'))
+    return risks
+
+
+def analyze_from_patterns(directory, versions=None, architectures=ARCHITECTURES):
+    """Analyze the 'from' regular expressions of the blocked edges in directory.
+
+    Each distinct pattern is compiled once, checked for constructs that
+    can backtrack badly, and timed while matching every known
+    release+architecture string (versions defaults to every version in
+    the channels and every blocked-edge 'to').  Patterns whose match sets
+    differ between anchored (show-edges) and unanchored matching, and
+    groups of patterns with identical match sets, are reported too.
+    """
+    patterns = collections.defaultdict(list)
+    targets = set()
+    for path, data in util.walk_yaml(directory=directory):
+        patterns[data['from']].append({'path': path, 'name': data.get('name')})
+        targets.add(str(data['to']))
+
+    if versions is None:
+        versions = targets
+        channels, _ = util.load_channels()
+        for channel in channels.values():
+            versions.update(channel.get('versions', []))
+    universe = sorted('{}+{}'.format(version.split('+', 1)[0], arch) for version in versions for arch in architectures)
+
+    report = {
+        'files': sum(len(files) for files in patterns.values()),
+        'universe': len(universe),
+        'patterns': [],
+        'equivalent': [],
+    }
+    match_sets = collections.defaultdict(list)
+    for pattern, files in sorted(patterns.items()):
+        entry = {'pattern': pattern, 'files': files}
+        report['patterns'].append(entry)
+        try:
+            regexp = re.compile(pattern)
+        except re.error as error:
+            entry['error'] = str(error)
+            continue
+        entry['backtracking'] = backtracking_risks(pattern=pattern)
+        start = time.perf_counter()
+        matched = frozenset(candidate for candidate in universe if regexp.match(candidate))
+        entry['seconds'] = time.perf_counter() - start
+        entry['matches'] = len(matched)
+        searched = set(candidate for candidate in universe if regexp.search(candidate))
+        if searched != matched:
+            entry['unanchored-matches'] = len(searched)
+        if matched:
+            match_sets[matched].append(pattern)
+    report['equivalent'] = sorted(sorted(group) for group in match_sets.values() if len(group) > 1)
+    return report
+
+
+def analyze_promql(directory, max_range='1h'):
+    """Analyze the PromQL matchingRules of the blocked edges in directory.
+
+    Expressions are parsed (through promql's AST cache) and canonicalized,
+    so equivalent expressions count once.  The report includes distinct
+    canonical expression counts per target release, which bound the
+    number of queries a cluster evaluates when considering that update,
+    and cost hints from promql.cost_hints for each canonical expression.
+    """
+    expressions = set()
+    rules = 0
+    releases = collections.defaultdict(set)
+    for path, data in util.walk_yaml(directory=directory):
+        for rule in data.get('matchingRules', []):
+            if rule.get('type') != 'PromQL':
+                continue
+            rules += 1
+            expression = rule['promql']['promql']
+            expressions.add(expression)
+            releases[str(data['to'])].add(promql.canonical(expression))
+
+    canonical_expressions = set(promql.canonical(expression) for expression in expressions)
+    hints = collections.defaultdict(int)
+    for expression in canonical_expressions:
+        for hint in set(promql.cost_hints(promql.parse(expression), max_range=max_range)):
+            hints[hint] += 1
+
+    return {
+        'rules': rules,
+        'expressions': len(expressions),
+        'canonical-expressions': len(canonical_expressions),
+        'releases': {release: len(releases[release]) for release in sorted(releases, key=_version_sort_key)},
+        'hints': dict(sorted(hints.items(), key=lambda item: (-item[1], item[0]))),
+    }
+
+
+def write_promql_report(report):
+    print('{} PromQL rules with {} distinct expressions ({} after canonicalization).'.format(report['rules'], report['expressions'], report['canonical-expressions']))
+    print('distinct canonical expressions per target release:')
+    for release, count in report['releases'].items():
+        print('  {}: {}'.format(release, count))
+    print('cost hints (number of canonical expressions affected):')
+    for hint, count in report['hints'].items():
+        print('  {}: {}'.format(hint, count))
+
+
+def _version_sort_key(version):
+    match = _VERSION_PREFIX_RE.match(version)
+    if not match:
+        return (), version
+    return tuple(int(part) for part in match.groups()), version
+
+
+def backtracking_risks(pattern):
+    """Return descriptions of constructs in pattern that may cause excessive backtracking."""
+    risks = set()
+
+    def walk(parsed, unbounded_depth):
+        previous_unbounded = False
+        for op, av in parsed:
+            unbounded = False
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                _, high, sub = av
+                unbounded = high == sre_parse.MAXREPEAT
+                if unbounded and unbounded_depth:
+                    risks.add('nested unbounded repetition')
+                if unbounded and previous_unbounded:
+                    risks.add('adjacent unbounded repetitions')
+                walk(sub, unbounded_depth + (1 if unbounded else 0))
+            elif op == sre_parse.SUBPATTERN:
+                walk(av[-1], unbounded_depth)
+            elif op == sre_parse.BRANCH:
+                for alternative in av[1]:
+                    walk(alternative, unbounded_depth)
+            elif op in (sre_parse.ASSERT, sre_parse.ASSERT_NOT):
+                walk(av[1], unbounded_depth)
+            previous_unbounded = unbounded
+
+    walk(sre_parse.parse(pattern), 0)
+    return sorted(risks)
+
+
+def write_from_pattern_report(report, slowest=10):
+    print('{} distinct from patterns in {} files, matched against {} release+architecture strings.'.format(len(report['patterns']), report['files'], report['universe']))
+    for entry in report['patterns']:
+        paths = ', '.join(sorted(f['path'] for f in entry['files']))
+        if 'error' in entry:
+            print('invalid pattern {!r}: {} ({})'.format(entry['pattern'], entry['error'], paths))
+        if entry.get('backtracking'):
+            print('possible excessive backtracking in {!r}: {} ({})'.format(entry['pattern'], ', '.join(entry['backtracking']), paths))
+        if 'unanchored-matches' in entry:
+            print('{!r} matches {} strings when anchored at the start, but {} when unanchored ({})'.format(entry['pattern'], entry['matches'], entry['unanchored-matches'], paths))
+    timed = sorted((entry for entry in report['patterns'] if 'seconds' in entry), key=lambda entry: -entry['seconds'] * len(entry['files']))
+    total = sum(entry['seconds'] * len(entry['files']) for entry in timed)
+    print('matching every file\'s pattern against every string takes {:.3f}s; most expensive patterns:'.format(total))
+    for entry in timed[:slowest]:
+        print('  {:8.1f}us per string, {} files, {} matches: {!r}'.format(1e6 * entry['seconds'] / max(report['universe'], 1), len(entry['files']), entry['matches'], entry['pattern']))
+    for group in report['equivalent']:
+        print('patterns with identical match sets, which could be merged: {}'.format(', '.join(repr(pattern) for pattern in group)))
+
+
 def validate_blocked_edge(data, path):
     for prop in ['to', 'from']:
         if prop not in data:
             raise ValueError('{!r} is a required property'.format(prop))
 
+    try:
+        re.compile(data['from'])
+    except (TypeError, re.error) as error:
+        raise ValueError('from must be a valid regular expression, not {!r}: {}'.format(data['from'], error))
+
     to = str(data['to'])
     if 'name' in data and not os.path.basename(path).startswith(to):
         raise ValueError(f"conditional risk to version {to} should be declared in a {to}-<...>.yaml file")
@@ -92,7 +434,13 @@ def validate_promql_rule(rule):
     if 'promql' not in rule['promql']:
         raise ValueError("promql.promql must be set for 'PromQL' rules")
     if not isinstance(rule['promql']['promql'], str):
-        raise ValueError('promql.promql value must be a string')  # FIXME: actual PromQL parser validation
+        raise ValueError('promql.promql value must be a string')
+    try:
+        tree = promql.parse(rule['promql']['promql'])
+    except ValueError as error:
+        raise ValueError('invalid promql.promql: {}'.format(error))
+    for warning in promql.regexp_warnings(tree):
+        _LOGGER.warning('promql.promql {!r}: {}'.format(rule['promql']['promql'], warning))
 
 
 CLUSTER_RULE_VALIDATORS = {
@@ -101,5 +449,167 @@ CLUSTER_RULE_VALIDATORS = {
 }
 
 
+class TestValidateBlockedEdges(unittest.TestCase):
+    def test_backtracking_risks(self):
+        test_cases = [
+            ('4[.]13[.].*', []),
+            ('^4[.](16[.]([1-2]?[0-9]|3[0-7])|17[.]([0-9]|1[0-6]))[+].*$', []),
+            ('(4[.]1[0-9]+)+[+].*', ['nested unbounded repetition']),
+            ('4[.].*.*', ['adjacent unbounded repetitions']),
+        ]
+
+        for pattern, expected in test_cases:
+            self.assertEqual(backtracking_risks(pattern=pattern), expected, pattern)
+
+    def test_promql_canonical(self):
+        test_cases = [
+            ('group(cluster_version{_id="",type="initial"})', 'group (cluster_version{_id="", type="initial"})'),
+            ('group by (b, a) (x{b="1", a="2"}) or on (_id) 0 * group(x{_id=""})', '(group by (a, b) (x{a="2", b="1"}) or on (_id) (0 * group (x{_id=""})))'),
+            ('max_over_time(x{_id=""}[60m])', 'max_over_time(x{_id=""}[1h])'),
+            ('sum(rate({__name__="x", a="b"}[5m])) by (a)', 'sum by (a) (rate(x{a="b"}[5m]))'),
+            ('max_over_time(x{a="b"}[5m:1m])', 'max_over_time((x{a="b"})[5m:1m])'),
+            ('max_over_time(rate(x{a="b"}[5m])[30m:])', 'max_over_time((rate(x{a="b"}[5m]))[30m:])'),
+            ('x{a="\\x41\\101\\u00e9\\303\\251\\t"}', 'x{a="AA\\u00e9\\u00e9\\t"}'),
+            ("x{a='it\\'s \"b\"'}", 'x{a="it\'s \\"b\\""}'),
+            ('x{a=`\\d+`}', 'x{a="\\\\d+"}'),
+        ]
+
+        for expression, expected in test_cases:
+            self.assertEqual(promql.canonical(expression), expected, expression)
+
+        for expression in ['x{a="\\q"}', 'x{a="\\400"}', 'x{a="\\xff"}', 'x{a="\\\'"}', "x{a='\\\"'}"]:
+            with self.assertRaisesRegex(ValueError, 'invalid string literal', msg=expression):
+                promql.canonical(expression)
+
+    def test_risk_fingerprint(self):
+        risk = {'to': '4.16.0', 'from': '.*', 'url': 'https://example.com/a', 'name': 'A', 'message': 'A.', 'matchingRules': [{'type': 'Always'}]}
+        self.assertEqual(util.risk_fingerprint(risk), util.risk_fingerprint(dict(risk, to='4.16.1', fixedIn='4.16.2')))
+        self.assertNotEqual(util.risk_fingerprint(dict(risk, message=datetime.date(2024, 1, 1))), util.risk_fingerprint(dict(risk, message='2024-01-01')))
+        with self.assertRaisesRegex(ValueError, 'risk A diverges on message'):
+            check_risk_divergence(name='A', path='a.yaml', data=dict(risk, message=datetime.date(2024, 1, 1)), other_path='b.yaml', other_data=dict(risk, message='2024-01-01'))
+
+    def test_load_risk_index(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.addCleanup(os.chdir, os.getcwd())
+            os.chdir(directory)
+
+            def commit(files, message):
+                for path, data in files.items():
+                    with open(path, 'w') as f:
+                        yaml.safe_dump(data, f)
+                util.git_output(['git', 'add', 'blocked-edges'])
+                util.git_output(['git', '-c', 'user.name=Test', '-c', 'user.email=test@example.com', 'commit', '--quiet', '--message', message])
+                return util.git_output(['git', 'rev-parse', 'HEAD']).strip()
+
+            risk = {'from': '4[.]15[.].*', 'url': 'https://example.com/a', 'name': 'A', 'message': 'A.', 'matchingRules': [{'type': 'Always'}]}
+            util.git_output(['git', 'init', '--quiet'])
+            os.mkdir('blocked-edges')
+            first = commit({'blocked-edges/4.16.0-A.yaml': dict(risk, to='4.16.0')}, 'Declare A')
+            index = load_risk_index(directory='blocked-edges', revision=first, index_path='index.json')
+            self.assertEqual(index, {'A': {'blocked-edges/4.16.0-A.yaml': util.risk_fingerprint(dict(risk, to='4.16.0'))}})
+
+            with open('index.json') as f:
+                stored = json.load(f)
+            stored['risks']['A']['sentinel'] = 'reused'
+            with open('index.json', 'w') as f:
+                json.dump(stored, f)
+            self.assertEqual(load_risk_index(directory='blocked-edges', revision=first, index_path='index.json')['A']['sentinel'], 'reused')
+
+            second = commit({'blocked-edges/4.16.1-A.yaml': dict(risk, to='4.16.1', message='Changed.'), 'blocked-edges/4.16.1-B.yaml': dict(risk, to='4.16.1', name='B')}, 'Declare B')
+            expected = load_risk_index(directory='blocked-edges', revision=second, index_path='fresh.json')
+            self.assertEqual(set(expected), {'A', 'B'})
+            updated = load_risk_index(directory='blocked-edges', revision=second, index_path='index.json')
+            self.assertEqual(updated['A'].pop('sentinel'), 'reused')  # incremental update kept the unchanged entries
+            self.assertEqual(updated, expected)
+
+            stored['revision'] = '0' * 40  # no longer available, so the index is rebuilt
+            with open('index.json', 'w') as f:
+                json.dump(stored, f)
+            self.assertEqual(load_risk_index(directory='blocked-edges', revision=second, index_path='index.json'), expected)
+
+    def test_promql_invalid(self):
+        for expression in ['group(x', 'topk(x)', 'max_over_time(group(x)[1h])', 'unknown_function(x)', '{a=""}', 'x and on () group_left y']:
+            with self.assertRaises(ValueError, msg=expression):
+                promql.parse(expression)
+
+    def test_promql_regexp(self):
+        rule = {'type': 'PromQL', 'promql': {'promql': 'group(x{a=~"\\\\pL+"}) or group(x{b=~"(a)\\\\1"})'}}
+        if promql.re2 is None:
+            with self.assertLogs(_LOGGER, level='WARNING') as logs:
+                validate_promql_rule(rule=rule)
+            self.assertEqual(len(logs.output), 2)
+            self.assertIn('Python cannot check', logs.output[0])
+            self.assertIn('uses backreference', logs.output[1])
+        else:
+            with self.assertRaisesRegex(ValueError, 'invalid regular expression'):
+                validate_promql_rule(rule=rule)
+            promql.parse('group(x{a=~"\\\\pL+"})')
+
+
 if __name__ == '__main__':
-    validate_blocked_edges(directory='blocked-edges')
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Validate blocked-edges declarations.',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        '--jobs',
+        metavar='COUNT',
+        type=int,
+        help='Validate in COUNT worker processes (0 for one per CPU) and report every error, instead of stopping at the first.',
+    )
+    parser.add_argument(
+        '--analyze-from',
+        dest='analyze_from',
+        action='store_true',
+        help="Instead of validating, report on the cost, backtracking risk, anchoring, and redundancy of the 'from' regular expressions.",
+    )
+    parser.add_argument(
+        '--analyze-promql',
+        dest='analyze_promql',
+        action='store_true',
+        help='Instead of validating, report distinct PromQL expression counts per target release and flag potentially expensive queries.',
+    )
+    parser.add_argument(
+        '--output',
+        choices=['text', 'json'],
+        help='Output format for --jobs, --analyze-from, and --analyze-promql.',
+        default='text',
+    )
+    parser.add_argument(
+        '--since',
+        metavar='REVISION',
+        help='Only validate blocked edges which changed since this Git revision (see gitrevisions(7) for syntax).',
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(levelname)s: %(message)s')
+    if args.analyze_promql:
+        report = analyze_promql(directory='blocked-edges')
+        if args.output == 'json':
+            print(json.dumps(report, indent=2))
+        else:
+            write_promql_report(report=report)
+    elif args.analyze_from:
+        report = analyze_from_patterns(directory='blocked-edges')
+        if args.output == 'json':
+            print(json.dumps(report, indent=2))
+        else:
+            write_from_pattern_report(report=report)
+    elif args.jobs is not None:
+        if args.since:
+            parser.error('--jobs and --since are mutually exclusive')
+        errors = collect_blocked_edge_errors(directory='blocked-edges', jobs=args.jobs or None)
+        if args.output == 'json':
+            print(json.dumps(errors, indent=2))
+        else:
+            for error in errors:
+                print('invalid blocked edge {}: {}'.format(error['path'], error['error']))
+        if errors:
+            sys.exit(1)
+    elif args.since:
+        validate_blocked_edges_since(directory='blocked-edges', since=args.since)
+    else:
+        validate_blocked_edges(directory='blocked-edges')